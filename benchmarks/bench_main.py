@@ -0,0 +1,136 @@
+# -*- coding:utf-8 -*-
+"""
+end-to-end benchmark of `ppic --installed`, against local fake pypi server (benchmarks/fakepypi.py).
+
+for each size of synthetic working set, cold-cache run, warm-cache run and
+expired-cache run (revalidated by conditional requests, 304) are measured.
+each run is a subprocess (for measuring peak memory, separately).
+
+  $ python benchmarks/bench_main.py --sizes 10 100 1000 --latency 0.01 --jobs 8
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+sys.path.insert(0, here)
+
+
+class SyntheticRequirement(object):
+    def __init__(self, name):
+        self.project_name = name
+        self.key = name
+
+
+class SyntheticDistribution(object):
+    def __init__(self, i, size):
+        self.project_name = self.key = "pkg{}".format(i)
+        self.version = "1.0"
+        # a few dependencies for each package (forming a DAG)
+        self._requires = ["pkg{}".format(j) for j in (i * 7 + 1, i * 13 + 2) if i < j < size]
+
+    def requires(self):
+        return [SyntheticRequirement(name) for name in self._requires]
+
+
+class SyntheticWorkingSet(object):
+    def __init__(self, size):
+        self.by_key = {}
+        for i in range(size):
+            d = SyntheticDistribution(i, size)
+            self.by_key[d.key] = d
+
+    def __iter__(self):
+        return iter(self.by_key.values())
+
+
+def run_one(args):
+    """running ppic.main() once in this process, and reporting as json"""
+    import io
+    import resource
+    import ppic
+
+    st = time.perf_counter()
+    working_set = SyntheticWorkingSet(args.size)
+    synthesize_time = time.perf_counter() - st
+
+    sys.argv = ["ppic", "--installed", "--delay", "0", "--stats"] + args.ppic_args
+    stdout = sys.stdout
+    sys.stdout = out = io.StringIO()
+    try:
+        ppic.main(working_set=working_set)
+    finally:
+        sys.stdout = stdout
+    wall = time.perf_counter() - st - synthesize_time
+    stats = json.loads(out.getvalue())["stats"]
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"wall": wall, "stats": stats, "maxrss_kb": maxrss}))
+
+
+def run_scenario(server, size, cache_path, ppic_args):
+    before = server.requests
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--run-one", "--size", str(size), "--",
+        "--index-url", server.index_url, "--cache-path", cache_path
+    ] + ppic_args
+    output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+    result = json.loads(output.decode("utf-8"))
+    requests = server.requests - before
+    stats = result["stats"]
+    fetch_time = stats["phases"].get("fetch", result["wall"])
+    return {
+        "wall": round(result["wall"], 3),
+        "phases": {k: round(v, 3) for k, v in sorted(stats["phases"].items())},
+        "latency": stats["requests"],
+        "counters": stats["counters"],
+        "peak_memory_mb": round(result["maxrss_kb"] / 1024.0, 1),
+        "requests": requests,
+        "requests_per_second": round(requests / fetch_time, 1) if fetch_time > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--releases", type=int, default=20)
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--cache-backend", default="json")
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("ppic_args", nargs="*", help="extra arguments passed to ppic (after --)")
+    args = parser.parse_args()
+    if args.run_one:
+        return run_one(args)
+
+    from fakepypi import FakePyPIServer
+    ppic_args = ["--jobs", str(args.jobs), "--cache-backend", args.cache_backend] + args.ppic_args
+    results = []
+    with FakePyPIServer(
+        latency=args.latency, releases=args.releases, files=args.files, error_rate=args.error_rate
+    ) as server:
+        for size in args.sizes:
+            tmpdir = tempfile.mkdtemp()
+            try:
+                cache_path = os.path.join(tmpdir, "cache")
+                modes = [("cold", []), ("warm", []), ("expired", ["--cache-timeout", "0"])]
+                for mode, extra_args in modes:
+                    result = run_scenario(server, size, cache_path, ppic_args + extra_args)
+                    result.update(size=size, mode=mode)
+                    results.append(result)
+                    sys.stderr.write("size={size} mode={mode} wall={wall}s\n".format(**result))
+            finally:
+                shutil.rmtree(tmpdir)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# -*- coding:utf-8 -*-
+"""
+local stand-in of pypi's json api, for benchmark.
+
+  GET /pypi/<name>/json
+
+- latency: seconds waited before each response
+- releases, files: size of payload (number of releases, and files per release)
+- error_rate: ratio of 503 responses (and names starting with "missing-" are 404)
+
+responses have ETag (If-None-Match is answered by 304), and are gzipped if Accept-Encoding has gzip.
+"""
+import gzip
+import json
+import time
+import hashlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_document(name, releases, files):
+    return {
+        "info": {
+            "name": name,
+            "version": "1.{}".format(releases - 1),
+            "summary": "synthetic package",
+            "description": "description of {}\n".format(name) * 20,
+        },
+        "releases": {
+            "1.{}".format(i): [
+                {
+                    "filename": "{}-1.{}-{}.tar.gz".format(name, i, j),
+                    "url": "https://example.com/{}/{}-1.{}-{}.tar.gz".format(name, name, i, j),
+                    "upload_time": "2015-01-{:02d}T00:00:00".format(i % 28 + 1),
+                    "size": 1000 + j,
+                    "digests": {"md5": "0" * 32, "sha256": "0" * 64},
+                } for j in range(files)
+            ] for i in range(releases)
+        },
+        "urls": [],
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "fakepypi"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            error = server.random.random() < server.error_rate
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "pypi" or parts[2] != "json" or parts[1].startswith(
+            "missing-"
+        ):
+            self.send_error(404, "Not Found")
+            return
+        if error:
+            self.send_error(503, "Service Unavailable")
+            return
+
+        body, gzipped, etag = server.get_body(parts[1])
+        if self.headers.get("If-None-Match") == etag:
+            with server.lock:
+                server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = gzipped
+        with server.lock:
+            server.sent_bytes += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePyPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # default(5) is too small for concurrent clients
+
+    def __init__(
+        self, address=("127.0.0.1", 0), latency=0.0, releases=10, files=2, error_rate=0.0, seed=0
+    ):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.releases = releases
+        self.files = files
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.sent_bytes = 0
+        self._bodies = {}
+        self._thread = None
+
+    @property
+    def index_url(self):
+        return "http://{}:{}/pypi".format(*self.server_address[:2])
+
+    def get_body(self, name):
+        """returning (body, gzipped body, etag)"""
+        cached = self._bodies.get(name)
+        if cached is None:
+            doc = make_document(name, self.releases, self.files)
+            body = json.dumps(doc).encode("utf-8")
+            etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+            cached = self._bodies[name] = (body, gzip.compress(body), etag)
+        return cached
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05, ), daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--releases", type=int, default=10)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakePyPIServer(
+        ("127.0.0.1", args.port),
+        latency=args.latency,
+        releases=args.releases,
+        files=args.files,
+        error_rate=args.error_rate
+    )
+    print("serving: {}".format(server.index_url))
+    server.serve_forever()
@@ -0,0 +1,78 @@
+# -*- coding:utf-8 -*-
+"""
+startup benchmark, for a fully cached `ppic --installed` run.
+
+  $ python benchmarks/startup.py --runs 10 --check 100
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+
+def prepare_cache(path, backend):
+    """every installed package is cached"""
+    from ppic import RequestRepository
+    from ppic.cache import make_store, CacheEntry
+    from ppic.environment import canonicalize_name
+    store = make_store(backend, path)
+    now = int(time.time())
+    with store.using():
+        for request in RequestRepository().collect_installed():
+            info = {
+                "info": {"name": request.name, "version": request.previous_version, "stable_version": None},
+                "releases": {request.previous_version: [{"upload_time": "2015-01-01T00:00:00"}]}
+            }
+            store.set(canonicalize_name(request.name), CacheEntry([info, True], now))  # same as lookup
+
+
+def measure(cmd, runs):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(here), env.get("PYTHONPATH", "")])
+    times = []
+    for i in range(runs):
+        st = time.perf_counter()
+        subprocess.check_call(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - st) * 1000)
+    times.sort()
+    return {"min": round(times[0], 1), "median": round(times[len(times) // 2], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--cache-backend", default="json")
+    parser.add_argument("--check", type=float, default=None, help="failed if median(ms) is over this")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(tmpdir, "cache")
+        prepare_cache(cache_path, args.cache_backend)
+        ppic = [
+            sys.executable, "-c", "import ppic; ppic.main()", "--installed",
+            "--cache-backend", args.cache_backend, "--cache-path", cache_path
+        ]
+        result = {
+            "python": measure([sys.executable, "-c", "pass"], args.runs),
+            "import ppic": measure([sys.executable, "-c", "import ppic"], args.runs),
+            "ppic --installed (cached)": measure(ppic, args.runs),
+        }
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print(json.dumps(result, indent=2))
+    if args.check is not None and result["ppic --installed (cached)"]["median"] > args.check:
+        sys.stderr.write("too slow: median is over {}ms\n".format(args.check))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,54 @@
 # -*- coding:utf-8 -*-
-import re
 import logging
-import os.path
 import argparse
 import json
 import sys
+import time
+import itertools
+import collections
 from collections import OrderedDict, namedtuple
-try:
-    from pip.utils import get_installed_distributions
-except ImportError:
-    import pkg_resources
-
-    def get_installed_distributions():
-        return pkg_resources.working_set
-
-
-import tempfile
-from distlib.version import NormalizedVersion, UnsupportedVersionError
-from .resource import PYPIJSONResource, CachedResourceWrapper
+from .environment import get_working_set, get_installed_distributions  # NOQA
+from .environment import backends as environment_backends
+from .environment import canonicalize_name
+from .version import VersionIndex, parse_version, is_unstable, unstable_rx
+from .resource import PYPIJSONResource, CachedResourceWrapper, RetryPolicy
+from .resource import make_local_resource, urlfmt_from_index_url, join_background
+from .cache import stores, make_store, default_cache_path, parse_size
+from .dependency import DependencyGraph, Expander
+from .requirements import parse_requirements_file
+from .stats import Stats, null_stats, emit, load_hook
+from .shard import parse_shard, select_shard
 
 logger = logging.getLogger(__name__)
 Request = namedtuple("Request", "name previous_version distribution")
 Options = namedtuple(
-    "Options", "is_collect_all is_stable_only delay_time see_dependencies cache_path cache_timeout"
+    "Options",
+    "is_collect_all is_stable_only delay_time see_dependencies cache_path cache_timeout"
+    " jobs use_asyncio cache_backend index_source index_url retries negative_cache_timeout stale_timeout"
+    " cache_max_size cache_max_age memory_cache_size"
 )
 
 default_options = Options(
     is_collect_all=True,
     is_stable_only=False,
     see_dependencies=False,
-    cache_path=os.path.join(tempfile.gettempdir(), "ppic.json"),
+    cache_path=default_cache_path("json"),
     cache_timeout=60 * 10,
-    delay_time=0.05
+    delay_time=0.05,
+    jobs=1,
+    use_asyncio=False,
+    cache_backend="json",
+    index_source=None,
+    index_url=None,
+    retries=3,
+    negative_cache_timeout=60,
+    stale_timeout=0,
+    cache_max_size=64 * 1024 * 1024,
+    cache_max_age=60 * 60 * 24 * 7,
+    memory_cache_size=16 * 1024 * 1024
 )
-
-
-def get_working_set():
-    # todo: drop it
-    import pkg_resources
-    return pkg_resources.working_set
+# the fields from jobs are optional, and the same as default_options
+Options.__new__.__defaults__ = default_options[Options._fields.index("jobs"):]
 
 
 class SuccessInfo(object):
@@ -47,32 +57,41 @@ class SuccessInfo(object):
         self.name = request.name
         self.info = info
         self.options = options
+        self._version = None
+        self._version_index = None
 
     @property
     def version(self):
+        if self._version is None:
+            self._version = self._find_version()
+        return self._version
+
+    def _find_version(self):
         if not self.options.is_stable_only:
             return self.info["info"]["version"]
 
-        version = self.info["info"]["stable_version"]
+        version = self.info["info"].get("stable_version")
         if version is None:
-            # todo:test
-            versions = sorted(self.info["releases"].keys(), reverse=True, key=self.maybe_version)
-            return self._guess_stable_version(versions)
+            version = self.version_index.latest_stable
+            if version is None:
+                logger.info("allrelease is unstable: name=%s", self.name)
+                return "xxx"
         return version
 
+    @property
+    def version_index(self):
+        if self._version_index is None:
+            self._version_index = VersionIndex(self.info["releases"].keys())
+        return self._version_index
+
     def maybe_version(self, v):
-        try:
-            return NormalizedVersion(v)
-        except UnsupportedVersionError:
-            return NormalizedVersion("0")
+        return parse_version(v)
 
-    unstable_rx = re.compile("[\._][0-9]*([_\-a-zA-Z]+[0-9]*)+$")
+    unstable_rx = unstable_rx
 
     def _guess_stable_version(self, version_candidates):
-        # this is heuristic.
-        # 1.8a, 1.8a1, 1.8x is unstable
         for v in version_candidates:
-            if not self.unstable_rx.search(v):
+            if not is_unstable(v):
                 return v
         logger.info("allrelease is unstable: name=%s", self.name)
         return "xxx"
@@ -104,6 +123,18 @@ class SuccessInfo(object):
         except KeyError:
             return self.name
 
+    def for_request(self, request):
+        """same information, for another request (e.g. a package in another environment)"""
+        info = self.__class__(request, self.info, self.options)
+        info._version_index = self._version_index
+        return info
+
+    def requires(self):
+        """requirements in requires_dist (of the latest version), requirements for extras are ignored"""
+        from .environment import parse_requirement
+        requirements = (parse_requirement(line) for line in self.info["info"].get("requires_dist") or ())
+        return [r for r in requirements if r is not None]
+
     def normalized_format(self):
         try:
             info = self.info
@@ -139,6 +170,13 @@ class FailureInfo(object):
     def project_name(self):
         return self.name
 
+    def for_request(self, request):
+        """same information, for another request (e.g. a package in another environment)"""
+        return self.__class__(request, self.msg, self.options)
+
+    def requires(self):
+        return []
+
 
 class RequestBuilder(object):
     def from_distribution(self, dist):
@@ -148,31 +186,39 @@ class RequestBuilder(object):
     def dummy(self, name):
         return Request(name=name, previous_version=None, distribution=None)
 
+    def pinned(self, name, version):
+        return Request(name=name, previous_version=version, distribution=None)
+
 
 class RequestRepository(object):
     def __init__(self, working_set=None):
         self.working_set = working_set or get_working_set()
-        self._by_project_name = None
+        self._by_canonical_name = None
         self.builder = RequestBuilder()
 
     @property
-    def by_project_name(self):
-        if self._by_project_name is None:
-            self._by_project_name = {d.project_name: d for d in self.by_key.values()}
-        return self._by_project_name
+    def by_canonical_name(self):
+        """canonical name (PEP 503) -> distribution, built once"""
+        if self._by_canonical_name is None:
+            index = {}
+            for key, d in self.by_key.items():
+                index.setdefault(canonicalize_name(key), d)
+                index.setdefault(canonicalize_name(d.project_name), d)
+            self._by_canonical_name = index
+        return self._by_canonical_name
 
     @property
     def by_key(self):
         return self.working_set.by_key
 
     def collect_installed(self):
-        return [self.builder.from_distribution(d) for d in get_installed_distributions()]
+        return [self.builder.from_distribution(d) for d in self.by_key.values()]
 
     def _find_distribution(self, name):
         try:
             return self.by_key[name]
         except KeyError:
-            return self.by_project_name.get(name)
+            return self.by_canonical_name.get(canonicalize_name(name))
 
     def find(self, name):
         d = self._find_distribution(name)
@@ -182,8 +228,8 @@ class RequestRepository(object):
         return self.builder.from_distribution(d)
 
 
-def parse(args):
-    parser = argparse.ArgumentParser()
+def make_parser(prog=None):
+    parser = argparse.ArgumentParser(prog=prog)
     parser.add_argument(
         '--all', action="store_true", help="(deprecated) same as --installed"
     )  # deprecated
@@ -193,12 +239,39 @@ def parse(args):
         action="store_true",
         help="collecting installed packages information in your env"
     )
+    parser.add_argument(
+        '--environment-backend',
+        choices=environment_backends,
+        default=environment_backends[0],
+        help="how to scan installed packages (metadata is faster than pkg_resources)"
+    )
+    parser.add_argument(
+        '-r',
+        '--requirements',
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="collecting information of packages in requirements file (pinned version is used)"
+    )
+    parser.add_argument(
+        '--env',
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="site-packages directory of an environment (multiple, reported for each environment)"
+    )
     parser.add_argument(
         '-d',
         '--dependency',
         action="store_true",
         help="collecting dependents package's information"
     )
+    parser.add_argument(
+        '--dependency-format',
+        choices=["tree", "graph"],
+        default="tree",
+        help="output format of dependencies (graph is node table and adjacency list)"
+    )
     parser.add_argument(
         '-s', '--stable-only', action="store_true", help="newest stable version(guessing)"
     )
@@ -213,12 +286,164 @@ def parse(args):
         type=int,
         help="temporary cache timeout(seconds)"
     )
+    parser.add_argument(
+        '--negative-cache-timeout',
+        default=default_options.negative_cache_timeout,
+        type=int,
+        help="temporary cache timeout of failures, e.g. not found (seconds)"
+    )
+    parser.add_argument(
+        '--stale-while-revalidate',
+        default=default_options.stale_timeout,
+        type=int,
+        metavar="SECONDS",
+        help="serving expired cache for a while, and refreshing it in background"
+    )
+    parser.add_argument(
+        '--cache-max-size',
+        default=default_options.cache_max_size,
+        type=parse_size,
+        metavar="SIZE",
+        help="max size of temporary cache, least recently used entries are evicted (e.g. 64M)"
+    )
+    parser.add_argument(
+        '--cache-max-age',
+        default=default_options.cache_max_age,
+        type=int,
+        metavar="SECONDS",
+        help="entries not used for SECONDS are evicted (expired ones are kept for revalidation, until then)"
+    )
+    parser.add_argument(
+        '--memory-cache-size',
+        default=default_options.memory_cache_size,
+        type=parse_size,
+        metavar="SIZE",
+        help="size of in-memory cache in front of the sqlite and files backends (0 is disabled)"
+    )
+    parser.add_argument(
+        '--cache-backend',
+        choices=sorted(stores.keys()),
+        default=default_options.cache_backend,
+        help="storage of temporary cache"
+    )
+    parser.add_argument(
+        '--cache-path',
+        default=None,
+        help="path of temporary cache(default is in tempdir, e.g. /tmp/ppic.json)"
+    )
+    parser.add_argument(
+        '--format',
+        choices=["json", "ndjson"],
+        default="json",
+        help="output format (with ndjson, each package is written as soon as it is fetched)"
+    )
+    parser.add_argument(
+        '--since',
+        default=None,
+        metavar="PREVIOUS_REPORT",
+        help="incremental run, emitting the difference from the previous report (json output of ppic)"
+    )
+    parser.add_argument(
+        '--save-report',
+        default=None,
+        metavar="PATH",
+        help="saving the whole report to PATH (e.g. for next --since)"
+    )
+    parser.add_argument(
+        '--shard',
+        default=None,
+        type=parse_shard,
+        metavar="I/N",
+        help="checking only I-th of N shards (partitioned by package name), merged by `ppic merge`"
+    )
+    parser.add_argument(
+        '--index-url',
+        default=None,
+        help="base url of pypi json api (default is https://pypi.org/pypi)"
+    )
+    parser.add_argument(
+        '--index-source',
+        default=None,
+        metavar="PATH",
+        help="local mirror (directory of json files, or dump file of json lines), instead of pypi"
+    )
+    parser.add_argument(
+        '--stats', action="store_true", help="including stats (time of each phase, cache hits, ...)"
+    )
+    parser.add_argument(
+        '--stats-hook',
+        action="append",
+        default=[],
+        metavar="MODULE:FUNCTION",
+        help="function called with stats, at the end (e.g. sending to metrics system)"
+    )
+    parser.add_argument(
+        '--server',
+        default=None,
+        metavar="URL",
+        help="asking to `ppic serve` daemon, e.g. http://127.0.0.1:8765 or unix:///tmp/ppic.sock"
+    )
     parser.add_argument(
         '--logging', choices=["debug", "info"], default=None, help="activation for logging message"
     )
-    parser.add_argument("--delay", type=float, default=0.05, help="delay time of each request")
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=0.05,
+        help="delay time of each request(shared by all jobs, as requests per second limit)"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=default_options.retries,
+        help="max retries of each request, on throttled (429, 503), server error, or timeout"
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=default_options.jobs,
+        help="number of concurrent fetching workers"
+    )
+    parser.add_argument(
+        '--asyncio',
+        action="store_true",
+        help="fetching with asyncio (connections are kept alive, at most --jobs connections)"
+    )
     parser.add_argument('package', nargs="*")
-    return parser.parse_args(args)
+    return parser
+
+
+def parse(args):
+    return make_parser().parse_args(args)
+
+
+def options_from_args(parser):
+    return Options(
+        is_collect_all=parser.all or parser.installed,
+        is_stable_only=parser.stable_only,
+        see_dependencies=parser.dependency,
+        delay_time=parser.delay,
+        cache_path=parser.cache_path or default_cache_path(parser.cache_backend),
+        cache_timeout=parser.cache_timeout,
+        jobs=parser.jobs,
+        use_asyncio=parser.asyncio,
+        cache_backend=parser.cache_backend,
+        index_source=parser.index_source,
+        index_url=parser.index_url,
+        retries=parser.retries,
+        negative_cache_timeout=parser.negative_cache_timeout,
+        stale_timeout=parser.stale_while_revalidate,
+        cache_max_size=parser.cache_max_size,
+        cache_max_age=parser.cache_max_age,
+        memory_cache_size=parser.memory_cache_size
+    )
+
+
+def setup_logging(parser):
+    if parser.logging:
+        logger.setLevel(getattr(logging, parser.logging.upper()))
+        logger.addHandler(logging.StreamHandler())
 
 
 def get_info_from_request(resource, request, options=default_options):
@@ -229,110 +454,379 @@ def get_info_from_request(resource, request, options=default_options):
         return FailureInfo(request, info_or_error, options)
 
 
-def collect_request_list(package_names, working_set, options):
-    def recursive_collect(request):
-        if request.distribution:
-            for d in request.distribution.requires():
-                request = repository.find(d.project_name)
-                s.add(request)
-                recursive_collect(request)
+def collect_request_list(package_names, working_set, options, graph=None, requirements=()):
+    s = OrderedDict()
+
+    def add(request):
+        s[canonicalize_name(request.name)] = request
 
-    s = set()
     repository = RequestRepository(working_set=working_set)
     if options.is_collect_all:
-        s.update(repository.collect_installed())
+        for request in repository.collect_installed():
+            add(request)
+    if graph is None and options.see_dependencies:
+        graph = DependencyGraph(repository)
     for name in package_names:
         request = repository.find(name)
 
-        s.add(request)
+        add(request)
         if options.see_dependencies:
-            recursive_collect(request)
-    return sorted(s, key=lambda r: r.name)
-
-
-def collect_info_list(request_list, options=default_options, usecache=False):
-    fmt = "collecting information .. takes at least {} sec \n"
-    sys.stderr.write(fmt.format(options.delay_time * (len(request_list) - 1)))
-    results = []
-    resource = PYPIJSONResource(options.delay_time)
+            graph.add(request)
+    if graph is not None:
+        for request in graph.nodes.values():
+            add(request)
+    # pinned version in requirements file is used as previous version
+    for request in requirements:
+        add(request)
+    return sorted(s.values(), key=lambda r: r.name)
+
+
+def make_resource(options=default_options, usecache=False, stats=null_stats):
+    if options.index_source is not None:
+        return make_local_resource(options.index_source)  # local disk, cache is not needed
+    resource = PYPIJSONResource(
+        options.delay_time,
+        urlfmt=urlfmt_from_index_url(options.index_url),
+        stats=stats,
+        retry_policy=RetryPolicy(retries=options.retries)
+    )
     if usecache:
-        resource = CachedResourceWrapper(resource, options.cache_path, options.cache_timeout)
+        resource = CachedResourceWrapper(
+            resource,
+            options.cache_path,
+            options.cache_timeout,
+            backend=make_store(
+                options.cache_backend,
+                options.cache_path,
+                stats=stats,
+                max_bytes=options.cache_max_size,
+                max_age=options.cache_max_age,
+                memory_bytes=options.memory_cache_size
+            ),
+            stats=stats,
+            negative_timeout=options.negative_cache_timeout,
+            stale_timeout=options.stale_timeout
+        )
+    return resource
+
+
+def iterate_info_list(
+    request_list,
+    options=default_options,
+    usecache=False,
+    resource=None,
+    stats=null_stats,
+    expand=None
+):
+    """
+    yielding info as soon as fetched (if jobs > 1, the order is not kept).
+
+    with expand (info -> new requests, e.g. dependency.Expander), the returned requests are fetched too,
+    while other fetches are in flight.
+    """
+    if options.use_asyncio and options.index_source is None:
+        from .aioresource import iterate_info_list_async, make_async_resource
+        if resource is None:
+            resource = make_async_resource(options, usecache=usecache, stats=stats)
+        for info in iterate_info_list_async(request_list, options, resource, expand=expand):
+            yield info
+        return
+
+    if resource is None:
+        resource = make_resource(options, usecache=usecache, stats=stats)
+    expand = expand or (lambda info: ())
     with resource.using():
-        for req in request_list:
-            results.append(get_info_from_request(resource, req, options))
+        if options.jobs <= 1:
+            pending = collections.deque(request_list)
+            while pending:
+                info = get_info_from_request(resource, pending.popleft(), options)
+                pending.extend(expand(info))
+                yield info
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+        from queue import Queue
+        completed = Queue()
+        in_flight = set()  # finished futures are dropped, so that their results are freed after yielded
+        with ThreadPoolExecutor(max_workers=options.jobs) as executor:
+
+            def submit(req):
+                f = executor.submit(get_info_from_request, resource, req, options)
+                in_flight.add(f)
+                f.add_done_callback(completed.put)
+
+            for req in request_list:
+                submit(req)
+            try:
+                while in_flight:
+                    f = completed.get()
+                    in_flight.discard(f)
+                    info = f.result()
+                    for req in expand(info):
+                        submit(req)
+                    yield info
+            finally:
+                for f in in_flight:
+                    f.cancel()
+
+
+def collect_info_list(
+    request_list,
+    options=default_options,
+    usecache=False,
+    resource=None,
+    stats=null_stats,
+    expand=None
+):
+    fmt = "collecting information .. takes at least {} sec \n"
+    sys.stderr.write(fmt.format(options.delay_time * (len(request_list) - 1)))
+    results = list(
+        iterate_info_list(
+            request_list, options, usecache=usecache, resource=resource, stats=stats, expand=expand
+        )
+    )
+    # keeping the order of request_list (already sorted by collect_request_list),
+    # requests found by expand are sorted by name, and placed after them
+    order = {req: i for i, req in enumerate(request_list)}
+    results.sort(key=lambda info: (order.get(info.request, len(order)), info.name))
     return results
 
 
+def format_candidate(r):
+    """returning (key, text) of the candidate, or None (if r is not candidate)"""
+    if not r.is_success():
+        return None
+    if r.is_new_install():
+        return "new_install_candidates", "{}: '' -> {!r}".format(r.project_name, r.version)
+    elif r.has_update():
+        return "update_candidates", "{}: {!r} -> {!r}".format(
+            r.project_name, r.previous_version, r.version
+        )
+    return None
+
+
 def rendering_info_list(results):
     output_dict = OrderedDict(packages=[])
     output_dict["packages"] = [r.normalized_format() for r in results]
 
-    output_dict["update_candidates"] = update_candidates = []
-    output_dict["new_install_candidates"] = new_install_candidates = []
+    output_dict["update_candidates"] = []
+    output_dict["new_install_candidates"] = []
 
     for r in results:
-        if not r.is_success():
-            continue
-
-        if r.is_new_install():
-            new_install_candidates.append("{}: '' -> {!r}".format(r.project_name, r.version))
-        elif r.has_update():
-            update_candidates.append(
-                "{}: {!r} -> {!r}".format(r.project_name, r.previous_version, r.version)
-            )
+        candidate = format_candidate(r)
+        if candidate is not None:
+            output_dict[candidate[0]].append(candidate[1])
     return output_dict
 
 
-def collect_dependencies(request, history, working_set):
-    if request.distribution is None:
-        return {request.name: "UNKNOWN"}
+def streaming_info_list(infos, out):
+    """writing each info as a json line, as soon as it is fetched. and the summary at last"""
+    candidates = []
+    for r in infos:
+        out.write(json.dumps(r.normalized_format(), ensure_ascii=False))
+        out.write("\n")
+        out.flush()
+        candidate = format_candidate(r)
+        if candidate is not None:
+            candidates.append((r.name, candidate))
+
+    summary = OrderedDict([("update_candidates", []), ("new_install_candidates", [])])
+    for _, (k, text) in sorted(candidates, key=lambda x: x[0]):
+        summary[k].append(text)
+    return summary
+
+
+def collect_dependencies(request, history, working_set, graph=None):
+    if graph is None:
+        graph = DependencyGraph(RequestRepository(working_set=working_set))
+    key = graph.key(graph.add(request))
+    if key not in graph.edges:
+        return {request.name: "UNKNOWN"}  # neither installed, nor found while fetching
+    return graph.render(key, history, initial=True)
+
+
+def rendering_dependencies(request_list, working_set, graph, fmt="tree"):
+    if fmt == "graph":
+        return graph.render_graph(request_list)
+    history = {}
+    maybe_dependencies = [
+        collect_dependencies(req, history=history, working_set=working_set, graph=graph)
+        for req in request_list
+    ]
+    return [e for e in maybe_dependencies if e is not None]
+
+
+def collect_environment_reports(
+    paths,
+    package_names,
+    options=default_options,
+    usecache=False,
+    backend="metadata",
+    dependency_format="tree",
+    resource=None,
+    stats=null_stats,
+    working_set_factory=get_working_set
+):
+    """reports for each environment (each package is fetched only once, even if shared)"""
+    environments = []
+    unique = OrderedDict()
+    for path in paths:
+        with stats.phase("working_set"):
+            working_set = working_set_factory([path], backend=backend)
+            working_set.by_key  # scanning
+        with stats.phase("collect_request_list"):
+            graph = DependencyGraph(RequestRepository(working_set=working_set))
+            request_list = collect_request_list(
+                package_names, working_set, options=options, graph=graph
+            )
+        environments.append((path, working_set, graph, request_list))
+        for req in request_list:
+            unique.setdefault(canonicalize_name(req.name), req)
+
+    request_list = sorted(unique.values(), key=lambda r: r.name)
+    stats.incr("packages", len(request_list))
+    with stats.phase("fetch"):
+        infos = collect_info_list(
+            request_list, options=options, usecache=usecache, resource=resource, stats=stats
+        )
+    fetched = {canonicalize_name(info.name): info for info in infos}
+
+    reports = []
+    for path, working_set, graph, request_list in environments:
+        results = [fetched[canonicalize_name(req.name)].for_request(req) for req in request_list]
+        report = OrderedDict(environment=path)
+        report.update(rendering_info_list(results))
+        if options.see_dependencies:
+            report["dependencies"] = rendering_dependencies(
+                request_list, working_set, graph, fmt=dependency_format
+            )
+        reports.append(report)
+    return OrderedDict(environments=reports)
+
+
+def run(
+    parser,
+    options,
+    out=sys.stdout,
+    working_set=None,
+    resource=None,
+    stats=null_stats,
+    working_set_factory=get_working_set
+):
+    """collecting, and returning output (with --format ndjson, packages are written to `out`)"""
+    usecache = not parser.no_cache
+    if parser.env:
+        return collect_environment_reports(
+            parser.env,
+            parser.package,
+            options=options,
+            usecache=usecache,
+            backend=parser.environment_backend,
+            dependency_format=parser.dependency_format,
+            resource=resource,
+            stats=stats,
+            working_set_factory=working_set_factory
+        )
+
+    with stats.phase("working_set"):
+        if working_set is None:
+            working_set = working_set_factory(backend=parser.environment_backend)
+        working_set.by_key  # scanning
+    with stats.phase("collect_request_list"):
+        graph = DependencyGraph(RequestRepository(working_set=working_set))
+        requirements = itertools.chain.from_iterable(
+            parse_requirements_file(f) for f in parser.requirements
+        )
+        request_list = collect_request_list(
+            parser.package, working_set, options=options, graph=graph, requirements=requirements
+        )
+        if parser.shard is not None:
+            request_list = select_shard(request_list, *parser.shard)
+    # dependencies of packages not installed are found in requires_dist, while fetching
+    expand = Expander(graph, request_list, stats=stats) if options.see_dependencies else None
+    if parser.since is not None:
+        from .delta import collect_delta
+        with stats.phase("fetch"):
+            report, output_dict = collect_delta(
+                parser.since,
+                request_list,
+                options=options,
+                usecache=usecache,
+                resource=resource,
+                stats=stats
+            )
+    elif parser.format == "ndjson":
+        with stats.phase("fetch"):
+            infos = iterate_info_list(
+                request_list,
+                options=options,
+                usecache=usecache,
+                resource=resource,
+                stats=stats,
+                expand=expand
+            )
+            output_dict = streaming_info_list(infos, out=out)
+    else:
+        with stats.phase("fetch"):
+            results = collect_info_list(
+                request_list,
+                options=options,
+                usecache=usecache,
+                resource=resource,
+                stats=stats,
+                expand=expand
+            )
+        with stats.phase("rendering"):
+            output_dict = rendering_info_list(results)
+        report = output_dict
+    if parser.save_report is not None:
+        from .cache import atomic_write
+        report = OrderedDict(report)
+        report.setdefault("checked_at", int(time.time()))  # not older than cache entries written
+        atomic_write(parser.save_report, json.dumps(report, indent=2, ensure_ascii=False))
+    if options.see_dependencies:
+        # packages found in requires_dist are rendered, too
+        discovered = sorted(expand.discovered, key=lambda r: r.name)
+        with stats.phase("rendering"):
+            output_dict["dependencies"] = rendering_dependencies(
+                request_list + discovered, working_set, graph, fmt=parser.dependency_format
+            )
+    stats.incr("packages", len(request_list))
+    return output_dict
+
 
-    def rec(dist, initial):
-        if dist is None:
-            return None
-        if dist._key in history:
-            children = history[dist._key]
-            if initial and len(children) <= 0:
-                return None
-            return {dist.project_name: children} if len(children) > 0 else dist.project_name
+def dump_output(output_dict, fmt="json"):
+    if fmt == "ndjson":
+        return json.dumps(output_dict, ensure_ascii=False)
+    return json.dumps(output_dict, indent=2, ensure_ascii=False)
 
-        children = history[dist._key] = []
-        for r in dist.requires():
-            child = rec(working_set.by_key.get(r.key), initial=False)
-            if child is not None:
-                children.append(child)
-        if initial and len(children) <= 0:
-            return None
-        return {dist.project_name: children} if len(children) > 0 else dist.project_name
 
-    return rec(request.distribution, initial=True)
+# subcommands, e.g. `ppic warm ...` (`ppic -- warm` is for the package named "warm")
+commands = {"warm": "ppic.warm:main", "serve": "ppic.serve:main", "merge": "ppic.shard:main"}
 
 
 def main(working_set=None):
-    parser = parse(sys.argv[1:])
-    if parser.logging:
-        logger.setLevel(getattr(logging, parser.logging.upper()))
-        logger.addHandler(logging.StreamHandler())
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        return load_hook(commands[sys.argv[1]])(sys.argv[2:], working_set=working_set)
 
-    options = Options(
-        is_collect_all=parser.all or parser.installed,
-        is_stable_only=parser.stable_only,
-        see_dependencies=parser.dependency,
-        delay_time=parser.delay,
-        cache_path=default_options.cache_path,
-        cache_timeout=parser.cache_timeout
-    )
-    if working_set is None:
-        working_set = get_working_set()
-    request_list = collect_request_list(parser.package, working_set, options=options)
-    results = collect_info_list(request_list, options=options, usecache=not parser.no_cache)
-
-    output_dict = rendering_info_list(results)
-    if options.see_dependencies:
-        history = {}
-        maybe_dependencies = [
-            collect_dependencies(req, history=history, working_set=working_set)
-            for req in request_list
-        ]
-        output_dict["dependencies"] = [e for e in maybe_dependencies if e is not None]
-    print(json.dumps(output_dict, indent=2, ensure_ascii=False))
+    parser = parse(sys.argv[1:])
+    if (parser.since or parser.save_report) and (parser.env or parser.format == "ndjson"):
+        make_parser().error("--since and --save-report are not supported with --env, --format ndjson")
+    if parser.shard and parser.env:
+        make_parser().error("--shard is not supported with --env")
+    if parser.server is not None:
+        from .client import request_server
+        return request_server(parser.server, parser, out=sys.stdout)
+
+    setup_logging(parser)
+    options = options_from_args(parser)
+    stats = Stats()
+    hooks = [load_hook(spec) for spec in parser.stats_hook]
+    output_dict = run(parser, options, out=sys.stdout, working_set=working_set, stats=stats)
+    if parser.stats:
+        output_dict["stats"] = stats.as_dict()
+    print(dump_output(output_dict, parser.format))
+    sys.stdout.flush()
+    # background refreshes (--stale-while-revalidate) are finished after the output
+    join_background()
+    emit(stats, hooks=hooks)
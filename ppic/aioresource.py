@@ -0,0 +1,392 @@
+# -*- coding:utf-8 -*-
+import io
+import ssl
+import gzip
+import time
+import asyncio
+import contextlib
+from urllib.parse import urlsplit, urljoin
+from logging import getLogger as get_logger
+from .resource import PYPIJSONResource, CachedResourceWrapper, RateLimiter, RetryPolicy
+from .resource import FetchResult, NOT_MODIFIED, request_headers, validators_from_headers
+from .resource import urlfmt_from_index_url, finish_in_background
+from .cache import make_store
+from .projection import load_projected
+from .stats import null_stats
+from .environment import canonicalize_name
+logger = get_logger(__name__)
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, code, reason, url, headers=None):
+        super().__init__(code, reason, url)
+        self.code = code
+        self.reason = reason
+        self.url = url
+        self.headers = headers or {}  # lower-cased keys
+
+    def __str__(self):
+        # same as urllib.error.HTTPError
+        return "HTTP Error {}: {}".format(self.code, self.reason)
+
+
+class Response(object):
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+class Connection(object):
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.keep_alive = True
+
+    async def request(self, host, path, headers=None):
+        lines = [
+            "GET {} HTTP/1.1".format(path),
+            "Host: {}".format(host),
+            "Accept: application/json",
+            "Connection: keep-alive",
+            "User-Agent: ppic",
+        ]
+        for k, v in (headers or {}).items():
+            lines.append("{}: {}".format(k, v))
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self.writer.drain()
+        return await self.read_response()
+
+    async def read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection is closed by server")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+        code = int(status)
+        if 100 <= code < 200 or code in (204, 304):
+            body = b""  # never has a body (RFC 7230 3.3.3), even without content-length
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked()
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            self.keep_alive = False
+
+        if version == "HTTP/1.0" or headers.get("connection", "").lower() == "close":
+            self.keep_alive = False
+        return Response(code, reason, headers, body)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";", 1)[0], 16)
+            if size == 0:
+                break
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+        # trailers
+        while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks)
+
+    def close(self):
+        self.keep_alive = False
+        self.writer.close()
+
+
+class ConnectionPool(object):
+    """persistent connections for a host, at most `size` connections are opened"""
+
+    def __init__(self, scheme, host, port, size):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.semaphore = asyncio.Semaphore(size)
+        self.idle = []
+
+    @property
+    def netloc(self):
+        default_port = 443 if self.scheme == "https" else 80
+        if self.port == default_port:
+            return self.host
+        return "{}:{}".format(self.host, self.port)
+
+    async def connect(self):
+        logger.debug("connect: host=%s, port=%s", self.host, self.port)
+        sslcontext = ssl.create_default_context() if self.scheme == "https" else None
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=sslcontext)
+        return Connection(reader, writer)
+
+    async def request(self, path, headers=None):
+        async with self.semaphore:
+            while self.idle:
+                conn = self.idle.pop()
+                try:
+                    response = await conn.request(self.netloc, path, headers=headers)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # keep-alive connection is closed by server, on idle.
+                    conn.close()
+                except BaseException:
+                    conn.close()  # e.g. cancelled by timeout
+                    raise
+            else:
+                conn = await self.connect()
+                try:
+                    response = await conn.request(self.netloc, path, headers=headers)
+                except BaseException:
+                    conn.close()
+                    raise
+
+            if conn.keep_alive:
+                self.idle.append(conn)
+            else:
+                conn.close()
+            return response
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+
+class AsyncPYPIJSONResource(object):
+    """access url return json, asynchronously. (connections are reused, each host)"""
+    urlfmt = PYPIJSONResource.urlfmt
+    max_redirects = 5
+    timeout = PYPIJSONResource.timeout
+
+    def __init__(
+        self, delay_time, limiter=None, pool_size=4, urlfmt=None, stats=null_stats, retry_policy=None
+    ):
+        self.delay_time = delay_time
+        self.stats = stats
+        self.limiter = limiter or RateLimiter.from_delay_time(delay_time)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.pool_size = pool_size
+        if urlfmt is not None:
+            self.urlfmt = urlfmt
+        self.pools = {}
+
+    def get_pool(self, url):
+        parsed = urlsplit(url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        k = (parsed.scheme, parsed.hostname, port)
+        pool = self.pools.get(k)
+        if pool is None:
+            pool = self.pools[k] = ConnectionPool(parsed.scheme, parsed.hostname, port, self.pool_size)
+        return pool
+
+    async def get(self, url, headers=None):
+        for i in range(self.max_redirects + 1):
+            parsed = urlsplit(url)
+            path = parsed.path + ("?" + parsed.query if parsed.query else "")
+            response = await self.get_pool(url).request(path or "/", headers=headers)
+            if response.status in (301, 302, 303, 307, 308) and "location" in response.headers:
+                url = urljoin(url, response.headers["location"])
+                logger.debug("redirect: url=%s", url)
+                continue
+            if response.status >= 400:
+                raise HTTPStatusError(response.status, response.reason, url, response.headers)
+            return response
+        raise HTTPStatusError(response.status, "too many redirects", url)
+
+    async def access(self, request):
+        result = await self.fetch(request)
+        return result.value, result.status
+
+    async def fetch(self, request, validators=None):
+        """returning FetchResult (with validators, conditional request is sent)"""
+        url = self.urlfmt.format(name=canonicalize_name(request.name))  # no redirect
+        headers = request_headers(validators)
+        attempt = 0
+        while True:
+            logger.debug("access: url=%s", url)
+            wait = self.limiter.reserve()  # delay for pypi server
+            if wait > 0:
+                await asyncio.sleep(wait)
+            st = time.perf_counter()
+            try:
+                try:
+                    response = await asyncio.wait_for(self.get(url, headers=headers), self.timeout)
+                finally:
+                    self.stats.observe(time.perf_counter() - st)
+                value = NOT_MODIFIED
+                if response.status != 304:
+                    self.stats.incr("bytes_received", len(response.body))
+                    body = response.body
+                    if response.headers.get("content-encoding") == "gzip":
+                        body = gzip.decompress(body)
+                    value = load_projected(io.BytesIO(body))
+            except (
+                HTTPStatusError,
+                OSError,
+                asyncio.TimeoutError,
+                asyncio.IncompleteReadError,
+                EOFError,
+                ValueError,
+            ) as e:
+                # ValueError and EOFError are broken response (e.g. truncated chunk, gzip, or json)
+                wait = self.retry_policy.handle(e, attempt, self.limiter, stats=self.stats)
+                if wait is None:
+                    self.stats.incr("failures")
+                    return FetchResult(str(e) or e.__class__.__name__, False, None)
+                await asyncio.sleep(wait)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return FetchResult(value, True, validators_from_headers(response.headers))
+
+    @contextlib.asynccontextmanager
+    async def using(self):
+        try:
+            yield self
+        finally:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools.clear()
+
+
+class AsyncCachedResourceWrapper(CachedResourceWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tasks = set()
+
+    async def access(self, request):
+        value, entry = self.lookup_entry(request)
+        if value is None:
+            value = self.store_result(request, await self.fetch(request, entry), entry)
+        return value
+
+    async def fetch(self, request, entry=None):
+        validators = entry.validators if entry is not None and entry.value[1] else None
+        return await self.resource.fetch(request, validators)
+
+    async def refresh(self, request):
+        entry = self.backend.get(self.key(request))
+        return self.store_result(request, await self.fetch(request, entry), entry, keep_success=True)
+
+    def revalidate(self, request):
+        if self.key(request) in self.revalidating:
+            return
+        self.revalidating.add(self.key(request))
+        task = asyncio.ensure_future(self._revalidate(request))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _revalidate(self, request):
+        try:
+            await self.refresh(request)
+            self.stats.incr("revalidated")
+        except Exception as e:
+            logger.warning("revalidate is failed: name=%s (%r)", request.name, e)
+        finally:
+            self.revalidating.discard(self.key(request))
+
+    async def join(self):
+        """waiting background refreshes"""
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    @contextlib.asynccontextmanager
+    async def using(self):
+        async with self.resource.using():
+            with self.backend.using():
+                try:
+                    yield self
+                finally:
+                    await self.join()
+
+
+async def get_info_from_request_async(resource, request, options):
+    from . import SuccessInfo, FailureInfo
+    info_or_error, status = await resource.access(request)
+    if status:
+        return SuccessInfo(request, info_or_error, options)
+    else:
+        return FailureInfo(request, info_or_error, options)
+
+
+def iterate_info_list_async(request_list, options, resource, expand=None):
+    """
+    yielding info as soon as fetched, driving an event loop (not blocking on each fetch).
+    with expand, the requests returned by expand(info) are fetched too.
+    """
+    expand = expand or (lambda info: ())
+    loop = asyncio.new_event_loop()
+    context = resource.using()
+
+    def finish():
+        try:
+            loop.run_until_complete(context.__aexit__(None, None, None))
+        finally:
+            loop.close()
+
+    try:
+        loop.run_until_complete(context.__aenter__())
+    except BaseException:
+        loop.close()
+        raise
+    pending = {
+        loop.create_task(get_info_from_request_async(resource, req, options)) for req in request_list
+    }
+    completed = False
+    try:
+        while pending:
+            done, pending = loop.run_until_complete(
+                asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            )
+            for task in done:
+                info = task.result()
+                for req in expand(info):
+                    pending.add(loop.create_task(get_info_from_request_async(resource, req, options)))
+                yield info
+        completed = True
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        if completed and getattr(resource, "tasks", None):
+            # background refreshes are joined (and the cache is saved) after the output is returned
+            finish_in_background(finish)
+        else:
+            finish()
+
+
+def make_async_resource(options, usecache=False, stats=null_stats):
+    resource = AsyncPYPIJSONResource(
+        options.delay_time,
+        pool_size=max(options.jobs, 1),
+        urlfmt=urlfmt_from_index_url(options.index_url),
+        stats=stats,
+        retry_policy=RetryPolicy(retries=options.retries)
+    )
+    if usecache:
+        resource = AsyncCachedResourceWrapper(
+            resource,
+            options.cache_path,
+            options.cache_timeout,
+            backend=make_store(
+                options.cache_backend,
+                options.cache_path,
+                stats=stats,
+                max_bytes=options.cache_max_size,
+                max_age=options.cache_max_age,
+                memory_bytes=options.memory_cache_size
+            ),
+            stats=stats,
+            negative_timeout=options.negative_cache_timeout,
+            stale_timeout=options.stale_timeout
+        )
+    return resource
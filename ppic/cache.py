@@ -0,0 +1,450 @@
+# -*- coding:utf-8 -*-
+import os.path
+import re
+import json
+import time
+import tempfile
+import threading
+import contextlib
+from collections import namedtuple, OrderedDict
+from logging import getLogger as get_logger
+from . import projection
+from .stats import null_stats
+logger = get_logger(__name__)
+
+# if the layout of entries is changed, ENTRY_VERSION must be increased (stale caches are rebuilt)
+# 2: validators (etag, last_modified) are stored
+# 3: last access time is stored (for LRU eviction)
+# 4: keyed by canonical name (PEP 503)
+ENTRY_VERSION = 4
+FORMAT_VERSION = projection.FORMAT_VERSION * 100 + ENTRY_VERSION
+
+CacheEntry = namedtuple("CacheEntry", "value timestamp validators")
+CacheEntry.__new__.__defaults__ = (None, )  # validators
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """exclusive lock among processes (flock, if available)"""
+    try:
+        import fcntl
+    except ImportError:  # e.g. windows, writing atomically is still safe (but last writer wins)
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(path, content):
+    """writing to temporary file, and renaming (readers never see a torn file)"""
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmppath = tempfile.mkstemp(dir=dirname, prefix=".ppic-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as w:
+            w.write(content)
+        os.replace(tmppath, path)
+    except BaseException:
+        os.unlink(tmppath)
+        raise
+
+
+size_rx = re.compile(r"^\s*(\d+)\s*([kmg]?)i?b?\s*$", re.IGNORECASE)
+
+
+def parse_size(text):
+    """e.g. '64M' -> 67108864"""
+    m = size_rx.match(text)
+    if m is None:
+        raise ValueError("invalid size: {!r}".format(text))
+    return int(m.group(1)) * 1024 ** " kmg".index((m.group(2) or " ").lower())
+
+
+def select_evictions(items, now, max_age=None, max_bytes=None):
+    """
+    items are (name, timestamp, accessed_at, size).
+    returning (names not used for max_age, least recently used names), the rest fits in max_bytes
+    """
+    expired = []
+    alive = []
+    for name, timestamp, accessed_at, size in items:
+        used_at = max(timestamp, accessed_at or 0)
+        if max_age is not None and now - used_at > max_age:
+            expired.append(name)
+        else:
+            alive.append((used_at, name, size))
+
+    lru = []
+    if max_bytes is not None:
+        total = sum(size for _, _, size in alive)
+        if total > max_bytes:
+            alive.sort()
+            for _, name, size in alive:
+                if total <= max_bytes:
+                    break
+                lru.append(name)
+                total -= size
+    return expired, lru
+
+
+def count_evictions(stats, expired, lru):
+    if expired:
+        stats.incr("cache_evicted_expired", len(expired))
+    if lru:
+        stats.incr("cache_evicted_lru", len(lru))
+
+
+class JSONFileStore(object):
+    """
+    all entries are in a json file (loading at first access, saving at last).
+
+    on saving, the file is re-read under a lock, and entries written by this process are merged
+    (newer one wins), so that concurrent processes don't destroy each other's entries.
+    entries not used (fetched or read) for max_age seconds, and least recently used entries
+    over max_bytes are evicted, on saving.
+    """
+
+    def __init__(
+        self, path, format_version=FORMAT_VERSION, stats=null_stats, max_bytes=None, max_age=None
+    ):
+        self.path = path
+        self.format_version = format_version
+        self.stats = stats
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._cache = None
+        self._dirty = set()
+        self._accessed = {}  # name -> last access time (in this process)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+        if self._dirty:
+            with self.stats.phase("cache_save"):
+                self.save(self.path)
+
+    def read(self, path):
+        """returning (entries, last access times)"""
+        if not os.path.exists(path):
+            logger.info("not found: cachepath=%s", path)
+            return {}, {}
+        try:
+            logger.info("load: cachepath=%s", path)
+            with open(path, "r") as r:
+                data = json.load(r)
+            if data.get("format") != self.format_version:
+                logger.info("stale layout, rebuilding: cachepath=%s", path)
+                return {}, {}
+            return data["entries"], data.get("accessed", {})
+        except Exception as e:
+            logger.exception("%s", e)
+            return {}, {}
+
+    def load(self, path):
+        self._cache = self.read(path)[0]
+
+    def save(self, path):
+        with file_lock(path + ".lock"):
+            # saved by other processes, after loading
+            entries, accessed = self.read(path)
+            for name in self._dirty:
+                entry = self._cache[name]
+                current = entries.get(name)
+                if current is None or current[1] <= entry[1]:
+                    entries[name] = entry
+            for name, accessed_at in self._accessed.items():
+                if name in entries and accessed.get(name, 0) < accessed_at:
+                    accessed[name] = accessed_at
+            self.evict(entries, accessed)
+            logger.info("save: cachepath=%s", path)
+            data = {"format": self.format_version, "entries": entries, "accessed": accessed}
+            atomic_write(path, json.dumps(data))
+        self._dirty.clear()
+        self._accessed.clear()
+
+    def evict(self, entries, accessed, now=None):
+        if self.max_age is None and self.max_bytes is None:
+            return
+        items = (
+            (name, entry[1], accessed.get(name), len(json.dumps(entry)))
+            for name, entry in entries.items()
+        )
+        expired, lru = select_evictions(
+            items, time.time() if now is None else now, max_age=self.max_age, max_bytes=self.max_bytes
+        )
+        for name in expired + lru:
+            del entries[name]
+            accessed.pop(name, None)
+            self._cache.pop(name, None)
+        count_evictions(self.stats, expired, lru)
+
+    @property
+    def cache(self):
+        if self._cache is not None:
+            return self._cache
+        with self._lock:
+            if self._cache is None:
+                with self.stats.phase("cache_load"):
+                    self.load(self.path)
+        return self._cache
+
+    def get(self, name):
+        try:
+            entry = CacheEntry(*self.cache[name])
+        except KeyError:
+            return None
+        self._accessed[name] = int(time.time())
+        return entry
+
+    def set(self, name, entry):
+        self.cache[name] = tuple(entry)
+        self._dirty.add(name)
+
+
+class FileStore(object):
+    """
+    an entry is a file (<path>/v<format>/<shard>/<name>.json), written atomically.
+    safe for concurrent processes, and only touched entries are read and written.
+    the mtime of the file is the last time used (fetched or read), for eviction after writing.
+    """
+
+    def __init__(
+        self, path, format_version=FORMAT_VERSION, stats=null_stats, max_bytes=None, max_age=None
+    ):
+        self.path = path
+        self.format_version = format_version
+        self.stats = stats
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.root = os.path.join(path, "v{}".format(format_version))
+        self._dirty = False
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+        if self._dirty:
+            self._dirty = False
+            with self.stats.phase("cache_save"):
+                self.evict()
+
+    def evict(self, now=None):
+        if self.max_age is None and self.max_bytes is None:
+            return
+        items = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                items.append((path, stat.st_mtime, None, stat.st_size))
+        expired, lru = select_evictions(
+            items, time.time() if now is None else now, max_age=self.max_age, max_bytes=self.max_bytes
+        )
+        for path in expired + lru:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        count_evictions(self.stats, expired, lru)
+
+    def entry_path(self, name):
+        import hashlib
+        from urllib.parse import quote
+        shard = hashlib.md5(name.encode("utf-8")).hexdigest()[:2]
+        return os.path.join(self.root, shard, quote(name, safe="") + ".json")
+
+    def get(self, name):
+        path = self.entry_path(name)
+        try:
+            with open(path, "r") as r:
+                entry = CacheEntry(*json.load(r))
+            os.utime(path)  # accessed
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.info("broken entry: path=%s (%r)", path, e)
+            return None
+
+    def set(self, name, entry):
+        path = self.entry_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps(list(entry)))
+        os.utime(path, (entry.timestamp, entry.timestamp))
+        self._dirty = True
+
+
+class SQLiteStore(object):
+    """entries are rows of sqlite table (only touched rows are read and written)"""
+    busy_timeout = 30
+
+    def __init__(
+        self, path, format_version=FORMAT_VERSION, stats=null_stats, max_bytes=None, max_age=None
+    ):
+        self.path = path
+        self.format_version = format_version
+        self.stats = stats
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._connection = None
+        self._dirty = False
+        self._accessed = {}  # name -> last access time
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def using(self):
+        try:
+            yield self
+        finally:
+            self.close()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            import sqlite3
+            logger.info("connect: cachepath=%s", self.path)
+            # shared by workers, so serialized by self._lock
+            with self.stats.phase("cache_load"):
+                # waiting for other processes' writing, instead of "database is locked"
+                self._connection = sqlite3.connect(
+                    self.path, timeout=self.busy_timeout, check_same_thread=False
+                )
+                self.migrate(self._connection)
+        return self._connection
+
+    def migrate(self, connection):
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.format_version:
+            logger.info("stale layout, rebuilding: cachepath=%s", self.path)
+            connection.execute("DROP TABLE IF EXISTS entries")
+            connection.execute("PRAGMA user_version = {:d}".format(self.format_version))
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries"
+            " (name TEXT PRIMARY KEY, value TEXT NOT NULL, timestamp INTEGER NOT NULL,"
+            " validators TEXT, accessed INTEGER)"
+        )
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                logger.info("save: cachepath=%s", self.path)
+                with self.stats.phase("cache_save"):
+                    self._connection.executemany(
+                        "UPDATE entries SET accessed = ? WHERE name = ?",
+                        [(t, name) for name, t in self._accessed.items()]
+                    )
+                    if self._dirty:
+                        self.evict(self._connection)
+                    self._connection.commit()
+                    self._connection.close()
+                self._connection = None
+                self._dirty = False
+                self._accessed.clear()
+
+    def evict(self, connection, now=None):
+        if self.max_age is None and self.max_bytes is None:
+            return
+        items = connection.execute(
+            "SELECT name, timestamp, accessed,"
+            " length(value) + coalesce(length(validators), 0) FROM entries"
+        ).fetchall()
+        expired, lru = select_evictions(
+            items, time.time() if now is None else now, max_age=self.max_age, max_bytes=self.max_bytes
+        )
+        connection.executemany("DELETE FROM entries WHERE name = ?", [(name, ) for name in expired + lru])
+        count_evictions(self.stats, expired, lru)
+
+    def get(self, name):
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value, timestamp, validators FROM entries WHERE name = ?", (name, )
+            ).fetchone()
+        if row is None:
+            return None
+        self._accessed[name] = int(time.time())
+        return CacheEntry(json.loads(row[0]), row[1], json.loads(row[2]) if row[2] else None)
+
+    def set(self, name, entry):
+        value = json.dumps(entry.value)
+        validators = json.dumps(entry.validators) if entry.validators else None
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (name, value, timestamp, validators)"
+                " VALUES (?, ?, ?, ?)",
+                (name, value, entry.timestamp, validators)
+            )
+            self._dirty = True
+
+
+class MemoryTier(object):
+    """
+    in-memory LRU tier in front of a store, within max_bytes (the size of entry is its json length).
+    kept across using() (e.g. by `ppic serve`), written through to the store.
+    """
+
+    def __init__(self, store, max_bytes, stats=null_stats):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.stats = stats
+        self.entries = OrderedDict()  # name -> (entry, size)
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def using(self):
+        return self.store.using()
+
+    def get(self, name):
+        with self._lock:
+            cached = self.entries.get(name)
+            if cached is not None:
+                self.entries.move_to_end(name)
+                self.stats.incr("memory_hit")
+                return cached[0]
+        entry = self.store.get(name)
+        if entry is not None:
+            self.put(name, entry)
+        return entry
+
+    def set(self, name, entry):
+        self.store.set(name, entry)
+        self.put(name, entry)
+
+    def put(self, name, entry):
+        size = len(json.dumps(entry))
+        with self._lock:
+            old = self.entries.pop(name, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_bytes:
+                return
+            self.entries[name] = (entry, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.stats.incr("memory_evicted")
+
+
+stores = {
+    "json": (JSONFileStore, "ppic.json"),
+    "sqlite": (SQLiteStore, "ppic.sqlite3"),
+    "files": (FileStore, "ppic.d"),
+}
+
+
+def default_cache_path(backend):
+    return os.path.join(tempfile.gettempdir(), stores[backend][1])
+
+
+def make_store(backend, path=None, stats=null_stats, max_bytes=None, max_age=None, memory_bytes=0):
+    cls, _ = stores[backend]
+    store = cls(path or default_cache_path(backend), stats=stats, max_bytes=max_bytes, max_age=max_age)
+    if memory_bytes and backend != "json":  # json store is on memory, already
+        store = MemoryTier(store, memory_bytes, stats=stats)
+    return store
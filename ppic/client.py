@@ -0,0 +1,79 @@
+# -*- coding:utf-8 -*-
+"""
+thin client of `ppic serve` (`ppic --server URL ...`), importing as little as possible.
+"""
+import os
+import sys
+import json
+import time
+import socket
+from urllib.parse import urlsplit
+
+# options which can be set by a query (the others, e.g. reading or writing files, are the server's own)
+query_options = (
+    "package", "all", "installed", "stable_only", "dependency", "dependency_format", "format", "stats",
+    "shard", "env"
+)
+
+
+def connect(url, timeout=None):
+    parsed = urlsplit(url)
+    if parsed.scheme == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(parsed.path)
+        return sock
+    return socket.create_connection((parsed.hostname, parsed.port or 80), timeout=timeout)
+
+
+def post(url, path, body, timeout=None):
+    """minimal HTTP/1.0 POST (http.client is slow to import), returning (status, body)"""
+    host = urlsplit(url).netloc if not url.startswith("unix:") else "localhost"
+    head = (
+        "POST {} HTTP/1.0\r\nHost: {}\r\nContent-Type: application/json\r\n"
+        "Content-Length: {}\r\n\r\n"
+    ).format(path, host, len(body))
+    sock = connect(url, timeout=timeout)
+    try:
+        sock.sendall(head.encode("latin-1") + body)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    response = b"".join(chunks)
+    head, _, data = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, data
+
+
+def request_server(url, args, out):
+    """thin client, asking the query (parsed arguments) to `ppic serve`"""
+    if args.since is not None or args.requirements:
+        sys.stderr.write("ppic: --since and -r are not supported with --server\n")
+        return 1
+    options = {k: getattr(args, k) for k in query_options}
+    options["env"] = [os.path.abspath(path) for path in args.env]
+    if args.shard is not None:
+        options["shard"] = "{}/{}".format(*args.shard)  # parsed again by the server
+
+    body = json.dumps({"options": options}).encode("utf-8")
+    status, data = post(url, "/query", body)
+    if status != 200:
+        sys.stderr.write("ppic serve: {} {}\n".format(status, data.decode("utf-8").strip()))
+        return 1
+    output = data.decode("utf-8")
+    if args.save_report is not None:
+        # the report is written by the client (the server doesn't write files for queries)
+        from collections import OrderedDict
+        from .cache import atomic_write
+        report = json.loads(output, object_pairs_hook=OrderedDict)
+        report.pop("stats", None)
+        report.setdefault("checked_at", int(time.time()))  # not older than cache entries written
+        atomic_write(args.save_report, json.dumps(report, indent=2, ensure_ascii=False))
+    out.write(output)
+    out.flush()
+    return 0
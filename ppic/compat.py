@@ -6,24 +6,32 @@ import json
 PY3 = sys.version_info[0] == 3
 
 if PY3:  # pragma: no cover
-    from urllib.error import HTTPError
+    from urllib.error import HTTPError, URLError
 else:
     HTTPError = Exception
+    URLError = IOError
 
 if PY3:
-    from urllib.request import urlopen
+    def urlopen(url, headers=None, timeout=None):
+        # slow to import (ssl, http.client, ...)
+        from urllib.request import Request, urlopen as _urlopen
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        return _urlopen(Request(url, headers=headers or {}), **kwargs)
 
-    def urlopen_json(url):
-        return json.load(urlopen(url))
+    def urlopen_json(url, load=json.load, timeout=None):
+        return load(urlopen(url, timeout=timeout))
 else:
-    from urllib import urlopen
+    from urllib import urlopen as _urlopen
+
+    def urlopen(url, headers=None, timeout=None):
+        return _urlopen(url)
 
     class HTTPError(Exception):
         pass
 
-    def urlopen_json(url):
+    def urlopen_json(url, load=json.load, timeout=None):
         r = urlopen(url)
         if r.code == 200:
-            return json.load(r)
+            return load(r)
         else:
             raise HTTPError("{!r} {}".format(r.code, r.url))
@@ -0,0 +1,158 @@
+# -*- coding:utf-8 -*-
+"""
+incremental run (`--since PREVIOUS_REPORT.json`).
+
+packages whose installed version is not changed are not fetched again, while their cached info is not
+expired (each package is expired by its own cache entry, and revalidated by conditional request),
+and the difference from the previous report is emitted.
+
+the report saved by `--save-report` has "checked_at" (the time when its packages are known to be current),
+otherwise the mtime of the report file is used. without cache (e.g. --no-cache), the whole previous
+report is expired after cache timeout.
+"""
+import os
+import json
+import time
+from collections import OrderedDict
+from .stats import null_stats
+from .environment import canonicalize_name
+from logging import getLogger as get_logger
+logger = get_logger(__name__)
+
+
+def report_key(name):
+    return canonicalize_name(name)
+
+
+def load_report(path):
+    with open(path) as r:
+        return json.load(r, object_pairs_hook=OrderedDict)
+
+
+def checked_at(report, path):
+    return report.get("checked_at") or os.path.getmtime(path)
+
+
+class ReportedInfo(object):
+    """information of a package, in the previous report (or in the output of a shard)"""
+
+    def __init__(self, request, entry):
+        self.request = request
+        self.name = request.name
+        self.entry = entry
+
+    @property
+    def version(self):
+        return self.entry["version"]
+
+    @property
+    def previous_version(self):
+        return self.request.previous_version
+
+    @property
+    def project_name(self):
+        return self.entry["name"]
+
+    def is_success(self):
+        return "error" not in self.entry
+
+    def is_new_install(self):
+        return self.previous_version is None
+
+    def has_update(self):
+        return (not self.is_new_install() and self.previous_version != self.version)
+
+    def normalized_format(self):
+        return self.entry
+
+
+def split_requests(request_list, report, is_expired):
+    """returning (reused infos, requests to be fetched)"""
+    entries = {report_key(entry["name"]): entry for entry in report.get("packages", [])}
+    reused = []
+    requests = []
+    for request in request_list:
+        entry = entries.get(report_key(request.name))
+        if (
+            entry is not None and "error" not in entry
+            and entry.get("_previous_version") == request.previous_version and not is_expired(request)
+        ):
+            reused.append(ReportedInfo(request, entry))
+        else:
+            requests.append(request)  # new, installed version is changed, failed, or expired
+    return reused, requests
+
+
+def expired_in_cache(resource, checked_at, now=None):
+    """
+    returning is_expired(request) for split_requests(). a package is expired if its cache entry is
+    not found, expired, or newer than the previous report (e.g. refreshed by another run).
+    """
+
+    def is_expired(request):
+        entry = resource.backend.get(resource.key(request))
+        return entry is None or entry.timestamp > checked_at or resource.expires_in(entry, now=now) < 0
+
+    return is_expired
+
+
+def diff_reports(previous, current):
+    def names(report):
+        return OrderedDict((report_key(e["name"]), e["name"]) for e in report.get("packages", []))
+
+    def diff(xs, ys):
+        ys = set(ys)
+        return [x for x in xs if x not in ys]
+
+    previous_names = names(previous)
+    current_names = names(current)
+    previous_candidates = previous.get("update_candidates", [])
+    current_candidates = current.get("update_candidates", [])
+
+    delta = OrderedDict()
+    delta["new_update_candidates"] = diff(current_candidates, previous_candidates)
+    delta["resolved_update_candidates"] = diff(previous_candidates, current_candidates)
+    delta["added_packages"] = [current_names[k] for k in diff(current_names, previous_names)]
+    delta["removed_packages"] = [previous_names[k] for k in diff(previous_names, current_names)]
+    return delta
+
+
+def collect_delta(path, request_list, options, usecache=False, resource=None, stats=null_stats):
+    """returning (report, delta)"""
+    from . import collect_info_list, rendering_info_list, make_resource
+    now = time.time()
+    previous = load_report(path)
+    previous_checked_at = checked_at(previous, path)
+    if resource is None:
+        if options.use_asyncio and options.index_source is None:
+            from .aioresource import make_async_resource
+            resource = make_async_resource(options, usecache=usecache, stats=stats)
+        else:
+            resource = make_resource(options, usecache=usecache, stats=stats)
+
+    backend = getattr(resource, "backend", None)
+    if backend is None:
+        expired = now - previous_checked_at > options.cache_timeout
+        if expired:
+            logger.info("previous report is expired: age=%s", now - previous_checked_at)
+        reused, requests = split_requests(request_list, previous, lambda request: expired)
+    else:
+        with backend.using():
+            is_expired = expired_in_cache(resource, previous_checked_at, now=now)
+            reused, requests = split_requests(request_list, previous, is_expired)
+    stats.incr("reused", len(reused))
+    infos = []
+    if requests:
+        infos = collect_info_list(
+            requests, options=options, usecache=usecache, resource=resource, stats=stats
+        )
+    order = {req: i for i, req in enumerate(request_list)}
+    results = sorted(reused + infos, key=lambda info: order[info.request])
+    report = rendering_info_list(results)
+    # without cache, reused packages are as old as the previous report.
+    # otherwise, after fetching (cache entries written by this run are not newer than the report)
+    report["checked_at"] = int(previous_checked_at if reused and backend is None else time.time())
+
+    delta = diff_reports(previous, report)
+    delta["rechecked"] = sorted(info.name for info in infos)
+    return report, delta
@@ -0,0 +1,119 @@
+# -*- coding:utf-8 -*-
+import itertools
+from collections import OrderedDict
+from .environment import canonicalize_name
+
+
+class DependencyGraph(object):
+    """dependency graph of requests, each node is visited (and its requires() is resolved) only once"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.nodes = OrderedDict()  # key -> request
+        self.edges = {}  # key -> [key] (only resolved nodes, i.e. installed, or found while fetching)
+
+    def key(self, request):
+        return canonicalize_name(request.name)
+
+    def __contains__(self, request):
+        return self.key(request) in self.nodes
+
+    def add(self, request):
+        """adding request and its dependencies (iteratively, cycle safe)"""
+        k = self.key(request)
+        if k in self.nodes:
+            return self.nodes[k]
+        self.nodes[k] = request
+        stack = [request]
+        while stack:
+            request = stack.pop()
+            if request.distribution is None:
+                continue
+            children = self.edges[self.key(request)] = []
+            for r in request.distribution.requires():
+                child = self.repository.find(r.project_name)
+                ck = self.key(child)
+                children.append(ck)
+                if ck not in self.nodes:
+                    self.nodes[ck] = child
+                    stack.append(child)
+        return self.nodes[k]
+
+    def expand(self, info):
+        """
+        adding dependencies found in requires_dist of fetched info (only for a package not installed,
+        the dependencies of installed package are already resolved by add()), returning added requests
+        """
+        request = info.request
+        k = self.key(request)
+        if request.distribution is not None or not info.is_success() or k in self.edges:
+            return []
+        self.nodes.setdefault(k, request)
+        size = len(self.nodes)
+        children = self.edges[k] = []
+        for r in info.requires():
+            children.append(self.key(self.add(self.repository.find(r.project_name))))
+        return list(itertools.islice(self.nodes.values(), size, None))
+
+    def render(self, key, history, initial=False, _visiting=None):
+        """rendering as nested format, e.g. {"pyramid": ["WebOb", {"zope.interface": ["setuptools"]}]}"""
+        request = self.nodes[key]
+        if key in history:
+            children = history[key]
+        elif _visiting is not None and key in _visiting:
+            return request.name  # cycle is found
+        else:
+            visiting = _visiting or set()
+            visiting.add(key)
+            children = []
+            for ck in self.edges.get(key, ()):
+                if ck not in self.edges:
+                    continue  # neither installed, nor found while fetching
+                child = self.render(ck, history, _visiting=visiting)
+                if child is not None:
+                    children.append(child)
+            visiting.discard(key)
+            history[key] = children
+
+        if initial and len(children) <= 0:
+            return None
+        return {request.name: children} if len(children) > 0 else request.name
+
+    def render_graph(self, requests):
+        """rendering as node table and adjacency list (each node appears once)"""
+        nodes = []
+        adjacency = OrderedDict()
+        for request in requests:
+            key = self.key(self.add(request))
+            request = self.nodes[key]
+            nodes.append(OrderedDict([("name", request.name), ("version", request.previous_version)]))
+            children = self.edges.get(key)
+            if children:
+                adjacency[request.name] = [self.nodes[ck].name for ck in children]
+        return OrderedDict([("nodes", nodes), ("adjacency", adjacency)])
+
+
+class Expander(object):
+    """
+    feeding requests found in requires_dist of fetched infos, back into the fetch queue
+    (e.g. iterate_info_list(..., expand=Expander(graph, request_list))).
+    each package is requested only once.
+    """
+
+    def __init__(self, graph, request_list, stats=None):
+        self.graph = graph
+        self.seen = {graph.key(request) for request in request_list}
+        self.stats = stats
+        self.discovered = []
+
+    def __call__(self, info):
+        found = []
+        for request in self.graph.expand(info):
+            k = self.graph.key(request)
+            if k not in self.seen:
+                self.seen.add(k)
+                found.append(request)
+        if found and self.stats is not None:
+            self.stats.incr("discovered", len(found))
+        self.discovered.extend(found)
+        return found
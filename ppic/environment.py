@@ -0,0 +1,148 @@
+# -*- coding:utf-8 -*-
+"""
+installed distributions (working set).
+
+- metadata: scanning *.dist-info and *.egg-info on sys.path (the files read by importlib.metadata),
+  without importing pkg_resources (that is slow, scanning everything at import time)
+- pkg_resources: pkg_resources.working_set
+"""
+import os
+import re
+import sys
+from collections import OrderedDict, namedtuple
+from logging import getLogger as get_logger
+logger = get_logger(__name__)
+
+Requirement = namedtuple("Requirement", "project_name key")
+name_rx = re.compile(r"\s*([A-Za-z0-9][A-Za-z0-9._\-]*)")
+unsafe_rx = re.compile(r"[^A-Za-z0-9.]+")
+separator_rx = re.compile(r"[-_.]+")
+
+
+def safe_key(name):
+    # same as pkg_resources's key (safe_name(name).lower())
+    return unsafe_rx.sub("-", name).lower()
+
+
+def canonicalize_name(name):
+    """normalized name of PEP 503 (e.g. 'Zope.Interface' -> 'zope-interface')"""
+    return separator_rx.sub("-", name).lower()
+
+
+def evaluate_marker(marker):
+    try:
+        from packaging.markers import Marker
+    except ImportError:
+        return True
+    try:
+        return Marker(marker).evaluate()
+    except Exception as e:
+        logger.debug("invalid marker: %r (%s)", marker, e)
+        return True
+
+
+def parse_requirement(line):
+    """parsing Requires-Dist (requirements for extras are ignored, same as pkg_resources)"""
+    spec, _, marker = line.partition(";")
+    marker = marker.strip()
+    if "extra" in marker:
+        return None
+    if marker and not evaluate_marker(marker):
+        return None
+    m = name_rx.match(spec)
+    if m is None:
+        return None
+    name = m.group(1)
+    return Requirement(project_name=name, key=safe_key(name))
+
+
+def read_headers(path, fields=("Name", "Version")):
+    result = {}
+    with open(path, encoding="utf-8", errors="replace") as r:
+        for line in r:
+            if not line.strip():
+                break
+            k, sep, v = line.partition(":")
+            if sep and k in fields and k not in result:
+                result[k] = v.strip()
+                if len(result) == len(fields):
+                    break
+    return result
+
+
+class MetadataDistribution(object):
+    def __init__(self, path, project_name, version):
+        self.path = path
+        self.project_name = project_name
+        self.version = version
+        self.key = safe_key(project_name)
+
+    def requires(self):
+        import pathlib
+        import importlib.metadata
+        lines = importlib.metadata.PathDistribution(pathlib.Path(self.path)).requires or []
+        return [r for r in (parse_requirement(line) for line in lines) if r is not None]
+
+    def __repr__(self):
+        return "<{} {} {}>".format(self.__class__.__name__, self.project_name, self.version)
+
+
+def load_distribution(path):
+    if os.path.isdir(path):
+        metadata = "METADATA" if path.endswith(".dist-info") else "PKG-INFO"
+        metadata_path = os.path.join(path, metadata)
+    else:
+        metadata_path = path  # e.g. foo-1.0-py3.4.egg-info (PKG-INFO itself)
+    try:
+        headers = read_headers(metadata_path)
+        return MetadataDistribution(path, headers["Name"], headers["Version"])
+    except (OSError, KeyError) as e:
+        logger.debug("broken metadata: path=%s (%r)", path, e)
+        return None
+
+
+def iterate_distributions(paths=None):
+    for entry in (sys.path if paths is None else paths):
+        try:
+            names = sorted(os.listdir(entry or "."))
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith((".dist-info", ".egg-info")):
+                dist = load_distribution(os.path.join(entry or ".", name))
+                if dist is not None:
+                    yield dist
+
+
+class MetadataWorkingSet(object):
+    def __init__(self, paths=None):
+        self.paths = paths
+        self._by_key = None
+
+    @property
+    def by_key(self):
+        if self._by_key is None:
+            by_key = OrderedDict()
+            for dist in iterate_distributions(self.paths):
+                by_key.setdefault(dist.key, dist)  # first one is used, same as sys.path
+            self._by_key = by_key
+        return self._by_key
+
+    def __iter__(self):
+        return iter(self.by_key.values())
+
+
+backends = ["metadata", "pkg_resources"]
+
+
+def get_working_set(paths=None, backend="metadata"):
+    if backend == "pkg_resources":
+        import pkg_resources
+        if paths is None:
+            return pkg_resources.working_set
+        return pkg_resources.WorkingSet(paths)
+    return MetadataWorkingSet(paths)
+
+
+def get_installed_distributions(paths=None, backend="metadata"):
+    return list(get_working_set(paths, backend=backend))
@@ -0,0 +1,126 @@
+# -*- coding:utf-8 -*-
+"""
+projection of pypi's json response.
+
+only the fields used by SuccessInfo are kept,
+ - info.name, info.version, info.stable_version, info.requires_dist
+ - releases (version -> upload_time of first file)
+
+if the layout of projected value is changed, FORMAT_VERSION must be increased
+(stale cache entries are rebuilt).
+"""
+import re
+import json
+import codecs
+# 2: info.requires_dist is kept (for expanding dependencies of packages not installed)
+FORMAT_VERSION = 2
+INFO_FIELDS = ("name", "version", "stable_version", "requires_dist")
+
+
+def project_release(files):
+    if files and "upload_time" in files[0]:
+        return [{"upload_time": files[0]["upload_time"]}]
+    return []
+
+
+def project_info(data):
+    info = data.get("info") or {}
+    releases = data.get("releases") or {}
+    return {
+        "info": {k: info.get(k) for k in INFO_FIELDS},
+        "releases": {version: project_release(files) for version, files in releases.items()}
+    }
+
+
+class StreamingProjector(object):
+    """
+    reading json incrementally, and keeping only the projected fields.
+
+    only a value currently read (e.g. a release's file list) is decoded as python object,
+    so the whole document tree is never built.
+    """
+    ws_rx = re.compile(r"[ \t\n\r]*")
+    decoder = json.JSONDecoder()
+
+    def __init__(self, fp, chunk_size=64 * 1024):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.incremental_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        # reading at least as many as buffered, for avoiding quadratic retrying on large value
+        size = max(self.chunk_size, len(self.buf) - self.pos)
+        chunk = self.fp.read(size)
+        if not isinstance(chunk, str):
+            chunk = self.incremental_decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = self.ws_rx.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError("{!r} is expected, but {!r} is found".format(ch, self.peek()))
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # e.g. a number may be continued in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def iterate_object(self):
+        """yielding keys of object, the value of each key must be consumed by caller"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def project(self):
+        result = {"info": {k: None for k in INFO_FIELDS}, "releases": {}}
+        for key in self.iterate_object():
+            if key == "info":
+                info = self.read_value() or {}
+                result["info"] = {k: info.get(k) for k in INFO_FIELDS}
+            elif key == "releases" and self.peek() == "{":
+                releases = result["releases"]
+                for version in self.iterate_object():
+                    releases[version] = project_release(self.read_value())
+            else:
+                self.read_value()  # skipped
+        return result
+
+
+def load_projected(fp, chunk_size=64 * 1024):
+    return StreamingProjector(fp, chunk_size=chunk_size).project()
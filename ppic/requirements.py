@@ -0,0 +1,56 @@
+# -*- coding:utf-8 -*-
+import os.path
+import re
+from logging import getLogger as get_logger
+logger = get_logger(__name__)
+
+requirement_rx = re.compile(
+    r"^(?P<name>[A-Za-z0-9][A-Za-z0-9._\-]*)\s*(\[[^\]]*\])?\s*(?P<op>===|==)?\s*(?P<version>[^\s;,]+)?"
+)
+# -r other.txt, -rother.txt, --requirement other.txt, --requirement=other.txt
+include_rx = re.compile(r"^(?:-r|--requirement)(?:\s*=\s*|\s+|)(\S.*)$")
+
+
+def iterate_lines(fp):
+    """logical lines (comments are removed, continued lines are joined)"""
+    buf = []
+    for line in fp:
+        line = re.sub(r"(^|\s)#.*$", "", line.rstrip("\r\n"))
+        if line.endswith("\\"):
+            buf.append(line[:-1])
+            continue
+        buf.append(line)
+        line = " ".join(buf).strip()
+        buf = []
+        if line:
+            yield line
+
+
+def parse_requirement_line(line, builder):
+    spec = line.split(" --", 1)[0].split(";", 1)[0].strip()  # e.g. --hash=sha256:..., markers
+    m = requirement_rx.match(spec)
+    if m is None:
+        logger.info("unsupported requirement: %r", line)
+        return None
+    version = m.group("version") if m.group("op") else None
+    return builder.pinned(m.group("name"), version)
+
+
+def parse_requirements_file(path, builder=None):
+    """yielding requests from requirements file (or lock file). `-r other.txt` is also followed"""
+    if builder is None:
+        from . import RequestBuilder
+        builder = RequestBuilder()
+    with open(path) as rf:
+        for line in iterate_lines(rf):
+            m = include_rx.match(line)
+            if m is not None:
+                included = os.path.join(os.path.dirname(path), m.group(1).strip())
+                for request in parse_requirements_file(included, builder=builder):
+                    yield request
+            elif line.startswith("-"):
+                logger.debug("option is ignored: %r", line)  # e.g. -e, -c, --index-url
+            else:
+                request = parse_requirement_line(line, builder)
+                if request is not None:
+                    yield request
@@ -1,74 +1,503 @@
 # -*- coding:utf-8 -*-
+import io
+import os
 import time
-import json
+import random
 import contextlib
-from .compat import urlopen_json, HTTPError
+import threading
+from http.client import HTTPException
+from collections import namedtuple, OrderedDict
+from .compat import urlopen, HTTPError, URLError
+from .cache import CacheEntry, JSONFileStore
+from .environment import canonicalize_name
+from .projection import load_projected
+from .stats import null_stats, CountingReader
 from logging import getLogger as get_logger
 logger = get_logger(__name__)
 
 
+class RateLimiter(object):
+    """
+    token bucket, shared by all workers (rate is requests per second)
+
+    the rate is adaptive (AIMD). it is halved when the server is throttling (429, 503),
+    and increased gradually on success, up to the initial rate.
+    """
+    throttled_rate = 10.0  # starting rate, when unlimited limiter is throttled
+
+    def __init__(
+        self, rate, capacity=1, clock=time.time, sleep=time.sleep, min_rate=0.5, increase=1.0, decrease=0.5
+    ):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated_at = None
+        self.paused_until = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_delay_time(cls, delay_time, **kwargs):
+        rate = 1.0 / delay_time if delay_time > 0 else None
+        return cls(rate, **kwargs)
+
+    def reserve(self):
+        """reserving a token, and returning waiting time(sec) until the token is available"""
+        with self.lock:
+            now = self.clock()
+            paused = self.paused_until - now if self.paused_until is not None else 0
+            if not self.rate:
+                return max(paused, 0)
+            if self.updated_at is not None:
+                elapsed = now - self.updated_at
+                self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+            # negative tokens mean waiting workers are queued.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            return max(wait, paused, 0)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """no one can access until `seconds` later (e.g. Retry-After)"""
+        with self.lock:
+            until = self.clock() + seconds
+            if self.paused_until is None or self.paused_until < until:
+                self.paused_until = until
+
+    def on_throttled(self):
+        with self.lock:
+            rate = (self.rate or self.throttled_rate) * self.decrease
+            self.rate = max(self.min_rate, rate)
+            logger.info("throttled: rate=%.2f", self.rate)
+
+    def on_success(self):
+        if not self.rate or self.rate == self.max_rate:
+            return
+        with self.lock:
+            # about +increase (requests per second), each second
+            rate = self.rate + self.increase / self.rate
+            ceil = self.max_rate or self.throttled_rate
+            if rate >= ceil:
+                rate = self.max_rate
+            self.rate = rate
+
+
+def parse_retry_after(value):
+    """seconds, or http-date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_tz, mktime_tz
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class RetryPolicy(object):
+    """exponential backoff with full jitter, honouring Retry-After"""
+    retryable_statuses = (429, 500, 502, 503, 504)
+    throttled_statuses = (429, 503)
+
+    def __init__(self, retries=3, base=0.5, cap=30.0, random=random.random):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.random = random
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.cap)
+        return self.random() * min(self.cap, self.base * 2 ** attempt)
+
+    def handle(self, e, attempt, limiter, stats=null_stats):
+        """returning waiting time before next attempt, or None (giving up)"""
+        code = getattr(e, "code", None)  # None is network error (e.g. timeout, connection refused)
+        if code is not None and code not in self.retryable_statuses:
+            return None
+        retry_after = None
+        if code in self.throttled_statuses:
+            stats.incr("throttled")
+            limiter.on_throttled()
+            headers = getattr(e, "headers", None)
+            if headers is not None:
+                retry_after = parse_retry_after(headers.get("retry-after"))
+        if attempt >= self.retries:
+            return None
+        wait = self.backoff(attempt, retry_after)
+        if retry_after is not None:
+            limiter.pause(wait)
+        stats.incr("retries")
+        logger.info("retry: after %.2fs (%s)", wait, e)
+        return wait
+
+
+# the value of FetchResult, when the cached value is not modified (304)
+NOT_MODIFIED = "<not modified>"
+FetchResult = namedtuple("FetchResult", "value status validators")
+
+
+def validators_from_headers(headers):
+    """ETag and Last-Modified of the response (for conditional request), or None"""
+    if headers is None:
+        return None
+    validators = {}
+    # lower-cased names (the headers of urllib are case insensitive)
+    for k, name in [("etag", "etag"), ("last_modified", "last-modified")]:
+        v = headers.get(name)
+        if v:
+            validators[k] = v
+    return validators or None
+
+
+def request_headers(validators=None):
+    headers = {"Accept-Encoding": "gzip"}
+    if validators:
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
 class PYPIJSONResource(object):
     """access url return json"""
-    urlfmt = "https://pypi.python.org/pypi/{name}/json"
+    urlfmt = "https://pypi.org/pypi/{name}/json"
+    timeout = 30
 
-    def __init__(self, delay_time):
+    def __init__(self, delay_time, limiter=None, urlfmt=None, stats=null_stats, retry_policy=None):
         self.delay_time = delay_time
+        self.limiter = limiter or RateLimiter.from_delay_time(delay_time)
+        if urlfmt is not None:
+            self.urlfmt = urlfmt
+        self.stats = stats
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    def load(self, fp, encoding=None):
+        fp = CountingReader(fp, self.stats)  # counting bytes on the wire (compressed)
+        if encoding == "gzip":
+            import gzip
+            fp = gzip.GzipFile(fileobj=fp)
+        return load_projected(fp)
 
     def access(self, request):
-        try:
-            url = self.urlfmt.format(name=request.name)
+        result = self.fetch(request)
+        return result.value, result.status
+
+    def fetch(self, request, validators=None):
+        """returning FetchResult (with validators, conditional request is sent)"""
+        url = self.urlfmt.format(name=canonicalize_name(request.name))  # no redirect
+        headers = request_headers(validators)
+        attempt = 0
+        while True:
             logger.debug("access: url=%s", url)
-            time.sleep(self.delay_time)  # delay for pypi server
-            return urlopen_json(url), True
-        except HTTPError as e:
-            return str(e), False
+            self.limiter.acquire()  # delay for pypi server
+            st = time.perf_counter()
+            try:
+                try:
+                    response = urlopen(url, headers=headers, timeout=self.timeout)
+                    with contextlib.closing(response):
+                        value = self.load(response, encoding=response.headers.get("Content-Encoding"))
+                finally:
+                    self.stats.observe(time.perf_counter() - st)
+            except (HTTPError, URLError, OSError, HTTPException, EOFError, ValueError) as e:
+                # including socket.timeout, and truncated body (IncompleteRead, or broken gzip/json)
+                if getattr(e, "code", None) == 304:
+                    self.limiter.on_success()
+                    return FetchResult(NOT_MODIFIED, True, validators_from_headers(e.headers))
+                wait = self.retry_policy.handle(e, attempt, self.limiter, stats=self.stats)
+                if wait is None:
+                    self.stats.incr("failures")
+                    return FetchResult(str(e), False, None)
+                time.sleep(wait)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return FetchResult(value, True, validators_from_headers(response.headers))
 
     @contextlib.contextmanager
     def using(self):
         yield self
 
 
+_background = []  # threads finishing resources, after the output is returned
+
+
+def finish_in_background(fn):
+    """calling fn (e.g. joining background refreshes, and saving the cache) in a thread"""
+    thread = threading.Thread(target=fn, name="ppic-finish")
+    thread.start()
+    _background.append(thread)
+    return thread
+
+
+def join_background():
+    """waiting finish_in_background() (the threads are not daemon, so they are waited at exit, anyway)"""
+    while _background:
+        _background.pop().join()
+
+
 class CachedResourceWrapper(object):
-    def __init__(self, resource, cachepath, timeout):
+    """
+    with stale_timeout, an expired entry is still served for stale_timeout seconds,
+    and it is refreshed in background (stale-while-revalidate). if refreshes are still running
+    when leaving using(), they are joined (and the cache is saved) in background, see join_background().
+    the next using() waits them.
+
+    if the resource supports fetch() (http), an expired entry is revalidated by conditional request
+    (If-None-Match, If-Modified-Since), and on 304 only its timestamp is renewed.
+    """
+    revalidate_workers = 2
+
+    def __init__(
+        self,
+        resource,
+        cachepath,
+        timeout,
+        backend=None,
+        stats=null_stats,
+        negative_timeout=60,
+        stale_timeout=0
+    ):
         self.resource = resource
         self.cachepath = cachepath
         self.timeout = timeout
-        self._cache = None
+        # failures (e.g. 404, or server is down) are cached shortly
+        self.negative_timeout = min(timeout, negative_timeout)
+        self.stale_timeout = stale_timeout
+        self.backend = backend or JSONFileStore(cachepath)
+        self.stats = stats
+        self.revalidating = set()
+        self.executor = None
+        self.finishing = None
+        self.lock = threading.Lock()
 
     @contextlib.contextmanager
     def using(self):
-        yield self
-        if self._cache is not None:
-            self.save(self.cachepath)
+        if self.finishing is not None:
+            self.finishing.join()  # the previous using()
+            self.finishing = None
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self.backend.using())
+            stack.callback(self.join)
+            yield self
+            if self.revalidating:
+                self.finishing = finish_in_background(stack.pop_all().close)
+
+    def expires_in(self, entry, now=None):
+        """seconds until the entry is expired (negative, if already expired)"""
+        timeout = self.timeout if entry.value[1] else self.negative_timeout
+        return entry.timestamp + timeout - (time.time() if now is None else now)
 
-    def load(self, cachepath):
+    def key(self, request):
+        """cache key (canonical name, e.g. 'Zope.Interface' and 'zope-interface' are the same entry)"""
+        return canonicalize_name(request.name)
+
+    def lookup(self, request):
+        """returning cached value, or None if not found (or expired)"""
+        return self.lookup_entry(request)[0]
+
+    def lookup_entry(self, request):
+        """returning (value, entry), value is None if not found (or expired)"""
+        entry = self.backend.get(self.key(request))
+        if entry is None:
+            self.stats.incr("cache_miss")
+            return None, None
+        expires_in = self.expires_in(entry)
+        if expires_in < 0:
+            if entry.value[1] and -expires_in <= self.stale_timeout:
+                self.stats.incr("cache_stale")
+                self.revalidate(request)
+                return entry.value, entry
+            self.stats.incr("cache_expired")
+            return None, entry
+        self.stats.incr("cache_hit")
+        return entry.value, entry
+
+    def store(self, request, value, validators=None):
+        self.backend.set(self.key(request), CacheEntry(value, int(time.time()), validators))
+
+    def store_result(self, request, result, entry=None, keep_success=False):
+        """storing the result of fetch(), and returning the value"""
+        if result.value is NOT_MODIFIED:
+            self.stats.incr("not_modified")
+            self.store(request, entry.value, result.validators or entry.validators)
+            return entry.value
+        value = (result.value, result.status)
+        if keep_success and not result.status and entry is not None and entry.value[1]:
+            # a failure doesn't overwrite a cached success (it is served, while stale)
+            logger.info("refresh is failed: name=%s (%s)", request.name, result.value)
+            return value
+        self.store(request, value, result.validators)
+        return value
+
+    def fetch(self, request, entry=None):
+        if not hasattr(self.resource, "fetch"):
+            return FetchResult(*self.resource.access(request), validators=None)
+        validators = entry.validators if entry is not None and entry.value[1] else None
+        return self.resource.fetch(request, validators)
+
+    def refresh(self, request):
+        entry = self.backend.get(self.key(request))
+        return self.store_result(request, self.fetch(request, entry), entry, keep_success=True)
+
+    def revalidate(self, request):
+        with self.lock:
+            if self.key(request) in self.revalidating:
+                return
+            self.revalidating.add(self.key(request))
+            if self.executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(max_workers=self.revalidate_workers)
+            self.executor.submit(self._revalidate, request)
+
+    def _revalidate(self, request):
         try:
-            logger.info("load: cachepath=%s", cachepath)
-            with open(cachepath, "r") as r:
-                self._cache = json.load(r)
+            self.refresh(request)
+            self.stats.incr("revalidated")
         except Exception as e:
-            logger.exception("%s", e)
-            self._cache = {}
+            logger.warning("revalidate is failed: name=%s (%r)", request.name, e)
+        finally:
+            with self.lock:
+                self.revalidating.discard(self.key(request))
+
+    def join(self):
+        """waiting background refreshes"""
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def access(self, request):
+        value, entry = self.lookup_entry(request)
+        if value is None:
+            value = self.store_result(request, self.fetch(request, entry), entry)
+        return value
+
+
+class LocalDirectoryResource(object):
+    """access json files in a mirror directory"""
+    layouts = ["{name}.json", "{name}/json", "json/{name}", "pypi/{name}/json"]
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def find_path(self, name):
+        for candidate in OrderedDict.fromkeys([name, name.lower(), canonicalize_name(name)]):
+            for layout in self.layouts:
+                path = os.path.join(self.directory, layout.format(name=candidate))
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def access(self, request):
+        path = self.find_path(request.name)
+        logger.debug("access: path=%s", path)
+        if path is None:
+            return "Not Found in {}: {}".format(self.directory, request.name), False
+        with open(path, "rb") as r:
+            return load_projected(r), True
 
-    def save(self, cachepath):
-        logger.info("save: cachepath=%s", cachepath)
-        with open(cachepath, "w") as w:
-            w.write(json.dumps(self._cache))
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+class DumpFileResource(object):
+    """
+    access a dump file (json lines, a pypi json document per line).
+    the dump file is memory mapped, and the document is found by on-disk index (canonical name -> offset).
+    """
+    index_version = 2  # 2: keyed by canonical name
+
+    def __init__(self, path, indexpath=None):
+        self.path = path
+        self.indexpath = indexpath or path + ".idx"
+        self.index = None
+        self.mapped = None
+
+    def index_header(self):
+        stat = os.stat(self.path)
+        return "#ppic-index {} {} {}\n".format(self.index_version, stat.st_size, int(stat.st_mtime))
+
+    def load_index(self):
+        header = self.index_header()
+        try:
+            with open(self.indexpath) as r:
+                if r.readline() == header:
+                    index = {}
+                    for line in r:
+                        name, offset, length = line.rstrip("\n").split("\t")
+                        index[name] = (int(offset), int(length))
+                    return index
+        except (IOError, OSError, ValueError) as e:
+            logger.info("index is broken: indexpath=%s (%r)", self.indexpath, e)
+        return self.build_index(header)
 
-    @property
-    def cache(self):
-        if self._cache is not None:
-            return self._cache
-        self.load(self.cachepath)
-        return self._cache
+    def build_index(self, header):
+        logger.info("build index: indexpath=%s", self.indexpath)
+        index = {}
+        offset = 0
+        with open(self.path, "rb") as r:
+            for line in r:
+                if line.strip():
+                    name = load_projected(io.BytesIO(line))["info"]["name"]
+                    if name is not None:
+                        index[canonicalize_name(name)] = (offset, len(line))
+                offset += len(line)
+        tmppath = "{}.{}.tmp".format(self.indexpath, os.getpid())
+        with open(tmppath, "w") as w:
+            w.write(header)
+            for name, (offset, length) in sorted(index.items()):
+                w.write("{}\t{}\t{}\n".format(name, offset, length))
+        os.rename(tmppath, self.indexpath)
+        return index
 
     def access(self, request):
         try:
-            value, timestamp = self.cache[request.name]
-            if time.time() - timestamp > self.timeout:
-                raise KeyError(request.name)
-            return value
+            offset, length = self.index[canonicalize_name(request.name)]
         except KeyError:
-            value = self.resource.access(request)
-            self._cache[request.name] = (value, int(time.time()))
-            return value
+            return "Not Found in {}: {}".format(self.path, request.name), False
+        return load_projected(io.BytesIO(self.mapped[offset:offset + length])), True
+
+    @contextlib.contextmanager
+    def using(self):
+        import mmap
+        self.index = self.load_index()
+        with open(self.path, "rb") as r:
+            if os.fstat(r.fileno()).st_size == 0:
+                self.mapped = b""
+                yield self
+                return
+            self.mapped = mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield self
+            finally:
+                self.mapped.close()
+                self.mapped = None
+
+
+def urlfmt_from_index_url(index_url):
+    """e.g. https://pypi.org/pypi -> https://pypi.org/pypi/{name}/json"""
+    if index_url is None:
+        return None
+    return index_url.rstrip("/") + "/{name}/json"
+
+
+def make_local_resource(path):
+    if os.path.isdir(path):
+        return LocalDirectoryResource(path)
+    return DumpFileResource(path)
@@ -0,0 +1,228 @@
+# -*- coding:utf-8 -*-
+"""
+`ppic serve`, a daemon keeping fetched information and working sets in memory.
+
+  $ ppic serve --port 8765 &
+  $ ppic --server http://127.0.0.1:8765 --installed
+
+or with unix domain socket,
+
+  $ ppic serve --socket /tmp/ppic.sock &
+  $ ppic --server unix:///tmp/ppic.sock --installed
+
+queries are answered with the same payload as `ppic` (POST /query, or GET /query?installed=&package=foo).
+queries are handled one by one (fetching is concurrent with --jobs threads, in a query;
+--asyncio is not supported by the server, and ignored).
+the client is ppic.client (`ppic --server URL`).
+"""
+import io
+import os
+import sys
+import json
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from .stats import Stats, null_stats
+from .client import query_options
+from logging import getLogger as get_logger
+logger = get_logger(__name__)
+
+
+def directory_stamp(paths):
+    """mtimes of directories (changed, if a package is installed or uninstalled)"""
+    stamp = []
+    for path in paths:
+        try:
+            stamp.append((path, os.stat(path or ".").st_mtime))
+        except OSError:
+            continue
+    return tuple(stamp)
+
+
+class WorkingSetCache(object):
+    """scanned working sets, rescanned if the directories are changed"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def __call__(self, paths=None, backend="metadata"):
+        from . import get_working_set
+        key = (tuple(paths) if paths is not None else None, backend)
+        stamp = directory_stamp(sys.path if paths is None else paths)
+        cached = self.entries.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        logger.info("scan: paths=%s", paths)
+        working_set = get_working_set(paths, backend=backend)
+        working_set.by_key  # scanning
+        self.entries[key] = (stamp, working_set)
+        return working_set
+
+
+class QueryError(Exception):
+    pass
+
+
+class App(object):
+    def __init__(self, options, stats=null_stats):
+        from . import make_resource
+        self.options = options._replace(use_asyncio=False)  # the resource is shared by queries (sync)
+        self.stats = stats  # stats of resource (cache hits, requests, ...), through the lifetime
+        self.resource = make_resource(options, usecache=True, stats=stats)
+        self.working_set_factory = WorkingSetCache()
+
+    def parse_args(self, pairs):
+        """[(name, value)] -> argparse.Namespace (True is a flag), checked by the parser as command line"""
+        from . import make_parser
+        argv = []
+        packages = []
+        for k, v in pairs:
+            if k not in query_options:
+                raise QueryError("not allowed in query: {}".format(k))
+            if k == "package":
+                if v is True:
+                    raise QueryError("package name is required")
+                packages.append(v)
+            else:
+                argv.append("--" + k.replace("_", "-"))
+                if v is not True:
+                    argv.append(v)
+        parser = make_parser(prog="ppic")
+
+        def error(message):
+            raise QueryError(message)
+
+        parser.error = error
+        args = parser.parse_args(argv + ["--"] + packages if packages else argv)
+        if args.package != packages:
+            raise QueryError("unexpected arguments (e.g. a value of flag): {}".format(args.package))
+        return args
+
+    def parse_query(self, params):
+        """(query string) -> argparse.Namespace, e.g. installed=&package=foo&shard=1/2"""
+        return self.parse_args([(k, v) if k == "package" or v else (k, True) for k, v in params])
+
+    def namespace(self, d):
+        """(posted json) -> argparse.Namespace, e.g. {"installed": true, "package": ["foo"]}"""
+        pairs = []
+        for k, v in d.items():
+            for item in v if isinstance(v, list) else [v]:
+                if item is None or item is False:
+                    continue
+                if item is not True and not isinstance(item, (str, int, float)):
+                    raise QueryError("invalid value: {}={!r}".format(k, item))
+                pairs.append((k, item if item is True else str(item)))
+        return self.parse_args(pairs)
+
+    def query(self, args):
+        """returning (content type, body)"""
+        from . import run, dump_output
+        if args.shard and args.env:
+            raise QueryError("--shard is not supported with --env")
+        options = self.options._replace(
+            is_collect_all=args.all or args.installed,
+            is_stable_only=args.stable_only,
+            see_dependencies=args.dependency
+        )
+        stats = Stats()
+        out = io.StringIO()
+        output_dict = run(
+            args,
+            options,
+            out=out,
+            resource=self.resource,
+            stats=stats,
+            working_set_factory=self.working_set_factory
+        )
+        if args.stats:
+            output_dict["stats"] = stats.as_dict()
+        out.write(dump_output(output_dict, args.format))
+        out.write("\n")
+        content_type = "application/x-ndjson" if args.format == "ndjson" else "application/json"
+        return content_type, out.getvalue().encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ppic"
+
+    def do_GET(self):
+        parsed = urlsplit(self.path)
+        if parsed.path == "/health":
+            return self.respond(200, "text/plain", b"ok\n")
+        if parsed.path != "/query":
+            return self.respond(404, "text/plain", b"not found\n")
+        self.handle_query(lambda: self.server.app.parse_query(parse_qsl(parsed.query, True)))
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/query":
+            return self.respond(404, "text/plain", b"not found\n")
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def parse():
+            try:
+                return self.server.app.namespace(json.loads(body.decode("utf-8"))["options"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise QueryError("invalid query: {!r}".format(e))
+
+        self.handle_query(parse)
+
+    def handle_query(self, parse):
+        try:
+            content_type, body = self.server.app.query(parse())
+        except QueryError as e:
+            return self.respond(400, "text/plain", "{}\n".format(e).encode("utf-8"))
+        except Exception as e:
+            logger.exception("query is failed")
+            return self.respond(500, "text/plain", "{!r}\n".format(e).encode("utf-8"))
+        self.respond(200, content_type, body)
+
+    def respond(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return str(self.client_address or "unix")
+
+    def log_message(self, fmt, *args):
+        logger.info("%s - %s", self.address_string(), fmt % args)
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)  # left by previous server
+        socketserver.UnixStreamServer.server_bind(self)
+
+
+def make_server(app, host="127.0.0.1", port=8765, socket_path=None):
+    if socket_path is not None:
+        server = UnixHTTPServer(socket_path, Handler)
+    else:
+        server = HTTPServer((host, port), Handler)
+    server.app = app
+    return server
+
+
+def main(argv, working_set=None):
+    from . import make_parser, options_from_args, setup_logging
+    parser = make_parser(prog="ppic serve")
+    parser.description = "queries are fetched with --jobs threads (--asyncio is ignored)"
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", default=None, metavar="PATH", help="listening unix domain socket")
+    args = parser.parse_args(argv)
+    setup_logging(args)
+    app = App(options_from_args(args), stats=Stats() if args.stats else null_stats)
+    server = make_server(app, host=args.host, port=args.port, socket_path=args.socket)
+    where = args.socket or "http://{}:{}".format(*server.server_address[:2])
+    sys.stderr.write("serving: {}\n".format(where))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
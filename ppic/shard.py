@@ -0,0 +1,116 @@
+# -*- coding:utf-8 -*-
+"""
+sharding (`--shard i/N`), and `ppic merge` combining the outputs of shards.
+
+packages are partitioned by stable hash of canonical name, so the same package is always
+in the same shard (in every process, every node).
+
+  $ ppic --installed --shard 1/3 > shard1.json
+  $ ppic --installed --shard 2/3 > shard2.json
+  $ ppic --installed --shard 3/3 > shard3.json
+  $ ppic merge shard1.json shard2.json shard3.json
+
+(the outputs of `--format ndjson` can be merged, too)
+"""
+import json
+import hashlib
+from collections import OrderedDict
+from .environment import canonicalize_name
+from logging import getLogger as get_logger
+logger = get_logger(__name__)
+
+
+def parse_shard(text):
+    """e.g. '2/3' -> (2, 3) (1-origin)"""
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError("invalid shard: {!r} (e.g. 1/3)".format(text))
+    if not sep or not (1 <= index <= count):
+        raise ValueError("invalid shard: {!r} (e.g. 1/3)".format(text))
+    return index, count
+
+
+def shard_of(name, count):
+    """1-origin shard number of the package (stable across processes, unlike hash())"""
+    digest = hashlib.md5(canonicalize_name(name).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % count + 1
+
+
+def select_shard(request_list, index, count):
+    return [request for request in request_list if shard_of(request.name, count) == index]
+
+
+def load_output(path):
+    """loading the output of ppic (json, or ndjson; the summary line of ndjson is skipped)"""
+    with open(path) as r:
+        content = r.read()
+    try:
+        return json.loads(content, object_pairs_hook=OrderedDict)
+    except ValueError:
+        packages = []
+        for line in content.splitlines():
+            if line.strip():
+                entry = json.loads(line, object_pairs_hook=OrderedDict)
+                if "name" in entry:
+                    packages.append(entry)
+        return OrderedDict(packages=packages)
+
+
+def merge_dependencies(dependencies_list):
+    """merging rendered dependencies (tree format: list, graph format: nodes and adjacency)"""
+    if all(isinstance(d, list) for d in dependencies_list):
+        merged = []
+        for dependencies in dependencies_list:
+            merged.extend(d for d in dependencies if d not in merged)
+        return merged
+    nodes = OrderedDict()
+    adjacency = OrderedDict()
+    for dependencies in dependencies_list:
+        for node in dependencies.get("nodes", []):
+            nodes.setdefault(node["name"], node)
+        adjacency.update(dependencies.get("adjacency", {}))
+    return OrderedDict([("nodes", list(nodes.values())), ("adjacency", adjacency)])
+
+
+def merge_reports(reports):
+    """combining the outputs of shards, into a report (same as rendering_info_list())"""
+    from . import Request, rendering_info_list
+    from .delta import ReportedInfo
+    entries = OrderedDict()
+    for report in reports:
+        for entry in report.get("packages", []):
+            # a package may be in many shards (e.g. found as dependency), the first one is used
+            entries.setdefault(canonicalize_name(entry["name"]), entry)
+
+    infos = []
+    for entry in sorted(entries.values(), key=lambda e: e["name"]):
+        request = Request(
+            name=entry["name"], previous_version=entry.get("_previous_version"), distribution=None
+        )
+        infos.append(ReportedInfo(request, entry))
+    merged = rendering_info_list(infos)
+
+    checked_at = [report["checked_at"] for report in reports if "checked_at" in report]
+    if checked_at:
+        merged["checked_at"] = min(checked_at)
+    dependencies_list = [report["dependencies"] for report in reports if "dependencies" in report]
+    if dependencies_list:
+        merged["dependencies"] = merge_dependencies(dependencies_list)
+    return merged
+
+
+def main(argv, working_set=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="ppic merge")
+    parser.add_argument("reports", nargs="+", metavar="REPORT", help="outputs of `ppic --shard i/N`")
+    parser.add_argument("-o", "--output", default=None, metavar="PATH", help="writing to PATH")
+    args = parser.parse_args(argv)
+    merged = merge_reports([load_output(path) for path in args.reports])
+    output = json.dumps(merged, indent=2, ensure_ascii=False)
+    if args.output is None:
+        print(output)
+    else:
+        from .cache import atomic_write
+        atomic_write(args.output, output)
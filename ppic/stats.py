@@ -0,0 +1,123 @@
+# -*- coding:utf-8 -*-
+"""
+instrumentation (time of each phase, latency of each request, counters).
+
+hooks are called with the stats (as dict) at the end of the run, e.g. for sending to metrics system.
+
+    from ppic.stats import add_hook
+    add_hook(lambda stats: send_to_metrics(stats))
+
+or `ppic --stats-hook mymodule:send_to_metrics`
+"""
+import time
+import threading
+import contextlib
+from collections import OrderedDict
+
+_hooks = []
+
+
+def add_hook(fn):
+    _hooks.append(fn)
+    return fn
+
+
+def remove_hook(fn):
+    _hooks.remove(fn)
+
+
+def load_hook(spec):
+    """e.g. 'mymodule:send_to_metrics'"""
+    import importlib
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def emit(stats, hooks=()):
+    """calling registered hooks (and extra hooks), with stats as dict"""
+    d = stats.as_dict()
+    for hook in list(_hooks) + list(hooks):
+        hook(d)
+    return d
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+class Stats(object):
+    """collected stats (thread safe)"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = OrderedDict()
+        self.latencies = []
+        self.counters = OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        st = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - st
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def as_dict(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            d = OrderedDict()
+            d["phases"] = OrderedDict((k, round(v, 6)) for k, v in self.phases.items())
+            d["requests"] = OrderedDict([
+                ("count", len(latencies)),
+                ("p50", percentile(latencies, 50)),
+                ("p90", percentile(latencies, 90)),
+                ("p99", percentile(latencies, 99)),
+                ("max", latencies[-1] if latencies else None),
+            ])
+            d["counters"] = OrderedDict(self.counters)
+            return d
+
+
+class NullStats(object):
+    """stats doing nothing (default)"""
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        yield
+
+    def incr(self, name, n=1):
+        pass
+
+    def observe(self, latency):
+        pass
+
+
+null_stats = NullStats()
+
+
+class CountingReader(object):
+    """counting bytes read from fp"""
+
+    def __init__(self, fp, stats, name="bytes_received"):
+        self.fp = fp
+        self.stats = stats
+        self.name = name
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.stats.incr(self.name, len(data))
+        return data
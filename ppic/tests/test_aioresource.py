@@ -0,0 +1,151 @@
+# -*- coding:utf-8 -*-
+import json
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from evilunit import test_target
+
+
+def _make_request(name):
+    from ppic import Request
+    return Request(name=name, previous_version=None, distribution=None)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    peers = None
+
+    def do_GET(self):
+        self.peers.add(self.client_address)
+        if self.path == "/moved/json":
+            self.send_response(301)
+            self.send_header("Location", "/pypi/foo/json")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if not self.path.startswith("/pypi/foo"):
+            self.send_error(404, "Not Found")
+            return
+        body = json.dumps({"info": {"name": "foo", "version": "0.1"}, "releases": {}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@test_target("ppic.aioresource:AsyncPYPIJSONResource")
+class Tests(unittest.TestCase):
+    def setUp(self):
+        handler = type("Handler", (Handler, ), {"peers": set()})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.peers = handler.peers
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01, ), daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _makeOne(self, pool_size=1):
+        urlfmt = "http://127.0.0.1:{}/{{name}}/json".format(self.server.server_address[1])
+        return self._getTarget()(0, pool_size=pool_size, urlfmt=urlfmt)
+
+    def _run(self, resource, names):
+        async def run():
+            async with resource.using():
+                return await asyncio.gather(*[resource.access(_make_request(n)) for n in names])
+        return asyncio.run(run())
+
+    def test_success(self):
+        target = self._makeOne()
+        result = self._run(target, ["pypi/foo"])
+        expected = {
+            "info": {"name": "foo", "version": "0.1", "stable_version": None, "requires_dist": None},
+            "releases": {}
+        }
+        self.assertEqual(result, [(expected, True)])
+
+    def test_failure(self):
+        target = self._makeOne()
+        result = self._run(target, ["pypi/bar"])
+        self.assertEqual(result, [("HTTP Error 404: Not Found", False)])
+
+    def test_redirect(self):
+        target = self._makeOne()
+        result = self._run(target, ["moved"])
+        self.assertTrue(result[0][1])
+        self.assertEqual(result[0][0]["info"]["name"], "foo")
+
+    def test_connections_are_reused(self):
+        target = self._makeOne(pool_size=2)
+        result = self._run(target, ["pypi/foo"] * 10)
+        self.assertTrue(all(status for _, status in result))
+        self.assertTrue(1 <= len(self.peers) <= 2)
+
+
+@test_target("ppic.aioresource:ConnectionPool")
+class ConnectionPoolTests(unittest.TestCase):
+    def test_idle_connection__closed_on_error(self):
+        class BrokenConnection(object):
+            closed = False
+
+            async def request(self, host, path, headers=None):
+                raise ValueError("broken")
+
+            def close(self):
+                self.closed = True
+
+        target = self._makeOne("http", "127.0.0.1", 80, 1)
+        conn = BrokenConnection()
+        target.idle.append(conn)
+
+        async def run():
+            await target.request("/pypi/foo/json")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+        self.assertTrue(conn.closed)
+        self.assertEqual(target.idle, [])
+
+
+@test_target("ppic.aioresource:iterate_info_list_async")
+class IterateTests(unittest.TestCase):
+    setUp = Tests.setUp
+    tearDown = Tests.tearDown
+
+    def test_it(self):
+        from ppic import default_options
+        from ppic.aioresource import AsyncPYPIJSONResource
+        urlfmt = "http://127.0.0.1:{}/{{name}}/json".format(self.server.server_address[1])
+        resource = AsyncPYPIJSONResource(0, pool_size=2, urlfmt=urlfmt)
+        requests = [_make_request(name) for name in ["pypi/foo", "pypi/bar", "pypi/foo"]]
+        result = list(self._getTarget()(requests, default_options, resource))
+        self.assertEqual(sorted(r.is_success() for r in result), [False, True, True])
+
+    def test_expand__found_requests_are_fetched(self):
+        import contextlib
+        from ppic import default_options
+
+        class Resource(object):
+            accessed = []
+
+            async def access(self, request):
+                self.accessed.append(request.name)
+                return {"info": {"name": request.name, "version": "0.1"}, "releases": {}}, True
+
+            @contextlib.asynccontextmanager
+            async def using(self):
+                yield self
+
+        def expand(info):
+            return [_make_request(name) for name in {"foo": ["bar", "baz"], "baz": ["qux"]}.get(info.name, [])]
+
+        resource = Resource()
+        result = list(self._getTarget()([_make_request("foo")], default_options, resource, expand=expand))
+        self.assertEqual(sorted(r.name for r in result), ["bar", "baz", "foo", "qux"])
+        self.assertEqual(sorted(resource.accessed), ["bar", "baz", "foo", "qux"])
@@ -0,0 +1,351 @@
+# -*- coding:utf-8 -*-
+import os.path
+import shutil
+import tempfile
+import unittest
+import contextlib
+from evilunit import test_target
+from ppic.resource import join_background
+
+
+def _make_request(name):
+    from ppic import Request
+    return Request(name=name, previous_version=None, distribution=None)
+
+
+class _StoreTests(object):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _makeOne(self, **kwargs):
+        return self._getTarget()(self.path, **kwargs)
+
+    def test_not_found(self):
+        target = self._makeOne()
+        with target.using():
+            self.assertIsNone(target.get("foo"))
+
+    def test_persistent(self):
+        from ppic.cache import CacheEntry
+        target = self._makeOne()
+        with target.using():
+            target.set("foo", CacheEntry([{"info": {"name": "foo"}}, True], 100))
+
+        target = self._makeOne()
+        with target.using():
+            result = target.get("foo")
+        self.assertEqual(result, ([{"info": {"name": "foo"}}, True], 100, None))
+
+    def test_stale_layout__rebuilt(self):
+        from ppic.cache import CacheEntry
+        target = self._getTarget()(self.path, format_version=0)
+        with target.using():
+            target.set("foo", CacheEntry(["foo", True], 100))
+
+        target = self._getTarget()(self.path, format_version=1)
+        with target.using():
+            self.assertIsNone(target.get("foo"))
+
+    def test_not_used_for_max_age__evicted(self):
+        import time
+        from ppic.cache import CacheEntry
+        from ppic.stats import Stats
+        now = int(time.time())
+        target = self._makeOne()
+        with target.using():
+            target.set("old", CacheEntry(["old", True], now - 1000))
+            target.set("new", CacheEntry(["new", True], now))
+
+        stats = Stats()
+        target = self._makeOne(max_age=500, stats=stats)
+        with target.using():
+            target.set("foo", CacheEntry(["foo", True], now))
+
+        target = self._makeOne()
+        with target.using():
+            self.assertIsNone(target.get("old"))
+            self.assertIsNotNone(target.get("new"))
+            self.assertIsNotNone(target.get("foo"))
+        self.assertEqual(stats.counters["cache_evicted_expired"], 1)
+
+    def test_over_max_bytes__least_recently_used_is_evicted(self):
+        import json
+        import time
+        from ppic.cache import CacheEntry
+        from ppic.stats import Stats
+        now = int(time.time())
+        value = ["x" * 1000, True]
+        target = self._makeOne()
+        with target.using():
+            for i, name in enumerate(["a", "b", "c"]):
+                target.set(name, CacheEntry(value, now - 100 + i))
+
+        stats = Stats()
+        size = len(json.dumps(value))
+        target = self._makeOne(max_bytes=size * 3 + size // 2, stats=stats)
+        with target.using():
+            target.get("a")  # "b" is least recently used
+            target.set("d", CacheEntry(value, now))
+
+        target = self._makeOne()
+        with target.using():
+            self.assertIsNone(target.get("b"))
+            for name in ["a", "c", "d"]:
+                self.assertIsNotNone(target.get(name), name)
+        self.assertEqual(stats.counters["cache_evicted_lru"], 1)
+
+
+@test_target("ppic.cache:JSONFileStore")
+class JSONFileStoreTests(_StoreTests, unittest.TestCase):
+    def test_concurrent_saving__merged(self):
+        from ppic.cache import CacheEntry
+        target0 = self._makeOne()
+        target1 = self._makeOne()
+        with target0.using():
+            with target1.using():
+                target0.set("foo", CacheEntry(["foo", True], 100))
+                target0.set("bar", CacheEntry(["bar0", True], 100))
+                target1.set("bar", CacheEntry(["bar1", True], 200))
+                target1.set("boo", CacheEntry(["boo", True], 100))
+
+        target = self._makeOne()
+        with target.using():
+            self.assertEqual(target.get("foo").value, ["foo", True])
+            self.assertEqual(target.get("bar").value, ["bar1", True])  # newer one
+            self.assertEqual(target.get("boo").value, ["boo", True])
+
+    def test_not_modified__not_saved(self):
+        target = self._makeOne()
+        with target.using():
+            target.get("foo")
+        self.assertFalse(os.path.exists(self.path))
+
+
+@test_target("ppic.cache:FileStore")
+class FileStoreTests(_StoreTests, unittest.TestCase):
+    def test_shared_by_instances(self):
+        from ppic.cache import CacheEntry
+        target0 = self._makeOne()
+        target1 = self._makeOne()
+        with target0.using(), target1.using():
+            target0.set("foo", CacheEntry(["foo", True], 100))
+            self.assertEqual(target1.get("foo").value, ["foo", True])
+
+
+@test_target("ppic.cache:SQLiteStore")
+class SQLiteStoreTests(_StoreTests, unittest.TestCase):
+    def test_only_touched_rows_are_written(self):
+        from ppic.cache import CacheEntry
+        target = self._makeOne()
+        with target.using():
+            target.set("foo", CacheEntry(["foo", True], 100))
+            target.set("bar", CacheEntry(["bar", True], 100))
+
+        target = self._makeOne()
+        with target.using():
+            target.set("bar", CacheEntry(["bar2", True], 200))
+
+        target = self._makeOne()
+        with target.using():
+            self.assertEqual(target.get("foo"), (["foo", True], 100, None))
+            self.assertEqual(target.get("bar"), (["bar2", True], 200, None))
+
+
+@test_target("ppic.cache:MemoryTier")
+class MemoryTierTests(unittest.TestCase):
+    def _makeOne(self, store, max_bytes):
+        from ppic.stats import Stats
+        self.stats = Stats()
+        return self._getTarget()(store, max_bytes, stats=self.stats)
+
+    def test_hit__store_is_not_touched(self):
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        target = self._makeOne(store, 1000)
+        target.set("foo", CacheEntry(["foo", True], 100))
+        store.d.clear()
+        self.assertEqual(target.get("foo"), (["foo", True], 100, None))
+        self.assertEqual(self.stats.counters["memory_hit"], 1)
+
+    def test_written_through(self):
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        target = self._makeOne(store, 1000)
+        target.set("foo", CacheEntry(["foo", True], 100))
+        self.assertEqual(store.get("foo"), (["foo", True], 100, None))
+
+    def test_over_max_bytes__least_recently_used_is_evicted(self):
+        import json
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        entry = CacheEntry(["x" * 100, True], 100)
+        target = self._makeOne(store, len(json.dumps(entry)) * 2)
+        target.set("a", entry)
+        target.set("b", entry)
+        target.get("a")
+        target.set("c", entry)
+        self.assertEqual(list(target.entries.keys()), ["a", "c"])
+        self.assertEqual(self.stats.counters["memory_evicted"], 1)
+        self.assertEqual(target.get("b"), entry)  # from store
+
+
+class CountingResource(object):
+    def __init__(self):
+        self.count = 0
+
+    def access(self, request):
+        self.count += 1
+        return request.name, True
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+class DictStore(object):
+    def __init__(self):
+        self.d = {}
+
+    def get(self, name):
+        return self.d.get(name)
+
+    def set(self, name, entry):
+        self.d[name] = entry
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+@test_target("ppic.resource:CachedResourceWrapper")
+class CachedResourceWrapperTests(unittest.TestCase):
+    def _makeOne(self, resource, store, timeout=10):
+        return self._getTarget()(resource, None, timeout, backend=store)
+
+    def test_cached(self):
+        resource = CountingResource()
+        target = self._makeOne(resource, DictStore())
+        with target.using():
+            target.access(_make_request("foo"))
+            result = target.access(_make_request("foo"))
+        self.assertEqual(result, ("foo", True))
+        self.assertEqual(resource.count, 1)
+
+    def test_expired(self):
+        from ppic.cache import CacheEntry
+        resource = CountingResource()
+        store = DictStore()
+        store.set("foo", CacheEntry(["old", True], 0))
+        target = self._makeOne(resource, store)
+        with target.using():
+            result = target.access(_make_request("foo"))
+        self.assertEqual(result, ("foo", True))
+        self.assertEqual(resource.count, 1)
+
+    def test_keyed_by_canonical_name(self):
+        resource = CountingResource()
+        store = DictStore()
+        target = self._makeOne(resource, store)
+        with target.using():
+            for name in ["Zope.Interface", "zope-interface", "zope_interface"]:
+                target.access(_make_request(name))
+        self.assertEqual(resource.count, 1)
+        self.assertEqual(list(store.d.keys()), ["zope-interface"])
+
+
+class SlowResource(CountingResource):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def access(self, request):
+        import time
+        time.sleep(self.delay)
+        return super().access(request)
+
+
+class FailingResource(CountingResource):
+    def access(self, request):
+        self.count += 1
+        return "HTTP Error 503: Service Unavailable", False
+
+
+@test_target("ppic.resource:CachedResourceWrapper")
+class StaleWhileRevalidateTests(unittest.TestCase):
+    def _makeOne(self, resource, store, timeout=10, stale_timeout=100):
+        return self._getTarget()(resource, None, timeout, backend=store, stale_timeout=stale_timeout)
+
+    def test_stale__served_and_refreshed_in_background(self):
+        import time
+        from ppic.cache import CacheEntry
+        resource = CountingResource()
+        store = DictStore()
+        store.set("foo", CacheEntry(["old", True], int(time.time()) - 60))
+        target = self._makeOne(resource, store)
+        with target.using():
+            result = target.access(_make_request("foo"))
+        join_background()
+        self.assertEqual(result, ["old", True])
+        self.assertEqual(resource.count, 1)
+        self.assertEqual(store.get("foo").value, ("foo", True))
+
+    def test_using__not_blocked_by_refreshes(self):
+        import time
+        from ppic.cache import CacheEntry
+        resource = SlowResource(0.3)
+        store = DictStore()
+        store.set("foo", CacheEntry(["old", True], int(time.time()) - 60))
+        target = self._makeOne(resource, store)
+        st = time.perf_counter()
+        with target.using():
+            target.access(_make_request("foo"))
+        self.assertLess(time.perf_counter() - st, 0.2)
+        self.assertEqual(store.get("foo").value, ["old", True])
+
+        with target.using():  # waiting the previous one
+            self.assertEqual(store.get("foo").value, ("foo", True))
+        join_background()
+
+    def test_too_stale__fetched(self):
+        import time
+        from ppic.cache import CacheEntry
+        resource = CountingResource()
+        store = DictStore()
+        store.set("foo", CacheEntry(["old", True], int(time.time()) - 1000))
+        target = self._makeOne(resource, store)
+        with target.using():
+            result = target.access(_make_request("foo"))
+        self.assertEqual(result, ("foo", True))
+
+    def test_refresh_is_failed__stale_entry_is_kept(self):
+        import time
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        store.set("foo", CacheEntry(["old", True], int(time.time()) - 60))
+        target = self._makeOne(FailingResource(), store)
+        with target.using():
+            target.access(_make_request("foo"))
+        join_background()
+        self.assertEqual(store.get("foo").value, ["old", True])
+
+
+@test_target("ppic:Options")
+class OptionsTests(unittest.TestCase):
+    def test_cache_is_bounded__by_default(self):
+        from ppic import default_options
+        target = self._getTarget()(
+            is_collect_all=False,
+            is_stable_only=False,
+            delay_time=0,
+            see_dependencies=False,
+            cache_path=None,
+            cache_timeout=600
+        )
+        self.assertEqual(target.cache_max_size, default_options.cache_max_size)
+        self.assertEqual(target.cache_max_age, default_options.cache_max_age)
+        self.assertEqual(target.memory_cache_size, default_options.memory_cache_size)
+        self.assertIsNotNone(target.cache_max_size)
@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+import os.path
+import shutil
+import tempfile
+import unittest
+import contextlib
+from evilunit import test_function
+
+
+class CountingResource(object):
+    def __init__(self):
+        self.accessed = []
+
+    def access(self, request):
+        self.accessed.append(request.name)
+        return {"info": {"name": request.name, "version": "2.0"}, "releases": {}}, True
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+@test_function("ppic:collect_environment_reports")
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _make_env(self, name, packages):
+        path = os.path.join(self.tmpdir, name)
+        for package, version in packages:
+            distinfo = os.path.join(path, "{}-{}.dist-info".format(package, version))
+            os.makedirs(distinfo)
+            with open(os.path.join(distinfo, "METADATA"), "w") as w:
+                w.write("Name: {}\nVersion: {}\n".format(package, version))
+        return path
+
+    def test_shared_packages_are_fetched_once(self):
+        from ppic import default_options
+        env0 = self._make_env("env0", [("foo", "1.0"), ("bar", "2.0")])
+        env1 = self._make_env("env1", [("foo", "2.0"), ("baz", "1.0")])
+        resource = CountingResource()
+        options = default_options._replace(delay_time=0)
+
+        result = self._callFUT([env0, env1], [], options=options, resource=resource)
+
+        self.assertEqual(sorted(resource.accessed), ["bar", "baz", "foo"])
+        reports = result["environments"]
+        self.assertEqual([r["environment"] for r in reports], [env0, env1])
+        self.assertEqual(reports[0]["update_candidates"], ["foo: '1.0' -> '2.0'"])
+        self.assertEqual(reports[1]["update_candidates"], ["baz: '1.0' -> '2.0'"])
+        self.assertEqual([p["name"] for p in reports[1]["packages"]], ["baz", "foo"])
@@ -0,0 +1,139 @@
+# -*- coding:utf-8 -*-
+import unittest
+import contextlib
+from evilunit import test_function
+
+
+def _make_request(name):
+    from ppic import Request
+    return Request(name=name, previous_version=None, distribution=None)
+
+
+def _make_options(jobs):
+    from ppic import default_options
+    return default_options._replace(delay_time=0, jobs=jobs)
+
+
+class SlowResource(object):
+    """the earlier request is, the slower response is"""
+
+    def __init__(self, names):
+        self.names = names
+        self.accessed = []
+
+    def access(self, request):
+        import time
+        time.sleep(0.01 * (len(self.names) - self.names.index(request.name)))
+        self.accessed.append(request.name)
+        return {"info": {"name": request.name, "version": "0.1"}, "releases": {}}, True
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+@test_function("ppic:collect_info_list")
+class Tests(unittest.TestCase):
+    def test_sequential(self):
+        names = ["a", "b", "c"]
+        resource = SlowResource(names)
+        result = self._callFUT([_make_request(n) for n in names], _make_options(1), resource=resource)
+        self.assertEqual([r.name for r in result], names)
+        self.assertEqual(resource.accessed, names)
+
+    def test_concurrent__order_is_kept(self):
+        names = ["a", "b", "c", "d"]
+        resource = SlowResource(names)
+        result = self._callFUT([_make_request(n) for n in names], _make_options(4), resource=resource)
+        self.assertEqual([r.name for r in result], names)
+        self.assertEqual(sorted(resource.accessed), names)
+        self.assertNotEqual(resource.accessed, names)
+
+
+class DependentResource(object):
+    def __init__(self, requires_dist):
+        self.requires_dist = requires_dist
+        self.accessed = []
+
+    def access(self, request):
+        self.accessed.append(request.name)
+        info = {"name": request.name, "version": "0.1", "requires_dist": self.requires_dist.get(request.name)}
+        return {"info": info, "releases": {}}, True
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+@test_function("ppic:collect_info_list")
+class ExpandTests(unittest.TestCase):
+    def _callFUT(self, names, requires_dist, jobs):
+        from ppic import RequestRepository
+        from ppic.dependency import DependencyGraph, Expander
+
+        class WorkingSet:
+            by_key = {}
+
+        request_list = [_make_request(n) for n in names]
+        expand = Expander(DependencyGraph(RequestRepository(WorkingSet())), request_list)
+        self.resource = DependentResource(requires_dist)
+        return self._getTarget()(request_list, _make_options(jobs), resource=self.resource, expand=expand)
+
+    def _assert_expanded(self, jobs):
+        requires_dist = {"z": ["b", "c (>=1.0)"], "c": ["d", "z"], "d": ["b"]}
+        result = self._callFUT(["z", "a"], requires_dist, jobs=jobs)
+        self.assertEqual([r.name for r in result], ["z", "a", "b", "c", "d"])
+        self.assertEqual(sorted(self.resource.accessed), ["a", "b", "c", "d", "z"])
+
+    def test_sequential(self):
+        self._assert_expanded(jobs=1)
+
+    def test_concurrent(self):
+        self._assert_expanded(jobs=4)
+
+
+@test_function("ppic:iterate_info_list")
+class IterateTests(unittest.TestCase):
+    def test_concurrent__yielded_as_soon_as_fetched(self):
+        names = ["a", "b", "c", "d"]
+        resource = SlowResource(names)
+        result = list(self._callFUT([_make_request(n) for n in names], _make_options(4), resource=resource))
+        self.assertEqual([r.name for r in result], resource.accessed)
+
+    def test_concurrent__yielded_infos_are_not_kept(self):
+        import gc
+        import weakref
+        names = ["a", "b", "c", "d"]
+        requests = [_make_request(n) for n in names]
+        infos = self._callFUT(requests, _make_options(2), resource=SlowResource(names))
+        refs = [weakref.ref(next(infos)) for _ in range(3)]
+        gc.collect()
+        self.assertEqual([ref() for ref in refs[:2]], [None, None])  # the last one is still in the generator
+        self.assertEqual(len(list(infos)), 1)
+
+
+@test_function("ppic:streaming_info_list")
+class StreamingTests(unittest.TestCase):
+    def _make_infos(self):
+        from ppic import SuccessInfo, FailureInfo, Request
+        return [
+            SuccessInfo(
+                Request(name="foo", previous_version="0.1", distribution=None),
+                {"info": {"name": "foo", "version": "0.2"}, "releases": {}}
+            ),
+            FailureInfo(Request(name="boo", previous_version=None, distribution=None), "404"),
+            SuccessInfo(
+                Request(name="bar", previous_version=None, distribution=None),
+                {"info": {"name": "bar", "version": "0.1"}, "releases": {}}
+            ),
+        ]
+
+    def test_it(self):
+        import io
+        import json
+        out = io.StringIO()
+        summary = self._callFUT(iter(self._make_infos()), out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line["name"] for line in lines], ["foo", "boo", "bar"])
+        self.assertEqual(summary["update_candidates"], ["foo: '0.1' -> '0.2'"])
+        self.assertEqual(summary["new_install_candidates"], ["bar: '' -> '0.1'"])
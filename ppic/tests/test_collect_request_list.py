@@ -84,3 +84,36 @@ class Tests(unittest.TestCase):
             result = self._callFUT(package_names, is_collect_all=True)
 
             self.assertEqual(result, [wana_install.foo])
+
+
+@test_function("ppic:collect_request_list")
+class CanonicalNameTests(unittest.TestCase):
+    def _callFUT(self, package_names, working_set):
+        from ppic import Options
+        options = Options(
+            is_collect_all=False,
+            is_stable_only=False,
+            see_dependencies=False,
+            delay_time=0,
+            cache_path=None,
+            cache_timeout=0
+        )
+        return self._getTarget()(package_names, working_set, options)
+
+    def test_not_installed__deduplicated(self):
+        class WorkingSet:
+            by_key = {}
+
+        result = self._callFUT(["Zope.Interface", "zope-interface", "zope_interface"], WorkingSet())
+        self.assertEqual(len(result), 1)
+
+    def test_installed__deduplicated(self):
+        class zope_interface:
+            project_name = "zope.interface"
+            version = "4.0"
+
+        class WorkingSet:
+            by_key = {"zope.interface": zope_interface}
+
+        result = self._callFUT(["Zope.Interface", "zope_interface"], WorkingSet())
+        self.assertEqual([(r.name, r.previous_version) for r in result], [("zope.interface", "4.0")])
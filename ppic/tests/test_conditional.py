@@ -0,0 +1,146 @@
+# -*- coding:utf-8 -*-
+import gzip
+import json
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from evilunit import test_target, test_function
+from ppic.tests.test_cache import DictStore
+
+
+def _make_request(name):
+    from ppic import Request
+    return Request(name=name, previous_version=None, distribution=None)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    etag = '"v1"'
+    log = None
+    length_on_304 = True
+
+    def do_GET(self):
+        self.log.append(dict(self.headers, path=self.path))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            if self.length_on_304:
+                self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"info": {"name": "foo", "version": "0.1"}, "releases": {}}).encode("utf-8")
+        body = gzip.compress(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@test_function("ppic.resource:request_headers")
+class RequestHeadersTests(unittest.TestCase):
+    def test_without_validators(self):
+        self.assertEqual(self._callFUT(None), {"Accept-Encoding": "gzip"})
+
+    def test_with_validators(self):
+        result = self._callFUT({"etag": '"v1"', "last_modified": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        self.assertEqual(result["If-None-Match"], '"v1"')
+        self.assertEqual(result["If-Modified-Since"], "Wed, 21 Oct 2015 07:28:00 GMT")
+
+
+class _ConditionalTests(object):
+    def setUp(self):
+        from ppic.stats import Stats
+        handler = self.handler = type("Handler", (Handler, ), {"log": []})
+        self.log = handler.log
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01, ), daemon=True)
+        self.thread.start()
+        self.stats = Stats()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _makeResource(self):
+        urlfmt = "http://127.0.0.1:{}/pypi/{{name}}/json".format(self.server.server_address[1])
+        resource = self._getResourceClass()(0, urlfmt=urlfmt, stats=self.stats)
+        resource.timeout = 5
+        return resource
+
+    def _makeOne(self, store):
+        return self._getTarget()(self._makeResource(), None, 10, backend=store, stats=self.stats)
+
+    def test_gzipped_response__decoded(self):
+        result = self._fetch(self._makeResource(), "foo")
+        self.assertEqual(result.value["info"]["name"], "foo")
+        self.assertEqual(result.validators["etag"], '"v1"')
+        self.assertEqual(self.log[0]["Accept-Encoding"], "gzip")
+
+    def test_requested_by_canonical_name(self):
+        self._fetch(self._makeResource(), "Zope.Interface")
+        self.assertEqual(self.log[0]["path"], "/pypi/zope-interface/json")
+
+    def test_304_without_content_length__not_waiting_for_body(self):
+        import time
+        from ppic.resource import NOT_MODIFIED
+        self.handler.length_on_304 = False
+        st = time.perf_counter()
+        result = self._fetch(self._makeResource(), "foo", validators={"etag": '"v1"'})
+        self.assertIs(result.value, NOT_MODIFIED)
+        self.assertLess(time.perf_counter() - st, 2)
+
+    def test_expired__revalidated_by_304(self):
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        self._access(self._makeOne(store), "foo")
+        entry = store.get("foo")
+        self.assertEqual(entry.validators["etag"], '"v1"')
+        store.set("foo", entry._replace(timestamp=0))  # expired
+
+        result = self._access(self._makeOne(store), "foo")
+        self.assertEqual(result, entry.value)
+        self.assertEqual(self.log[1]["If-None-Match"], '"v1"')
+        self.assertGreater(store.get("foo").timestamp, 0)
+        self.assertEqual(self.stats.as_dict()["counters"]["not_modified"], 1)
+        self.assertIsInstance(store.get("foo"), CacheEntry)
+
+
+@test_target("ppic.resource:CachedResourceWrapper")
+class ConditionalTests(_ConditionalTests, unittest.TestCase):
+    def _getResourceClass(self):
+        from ppic.resource import PYPIJSONResource
+        return PYPIJSONResource
+
+    def _fetch(self, resource, name, validators=None):
+        return resource.fetch(_make_request(name), validators)
+
+    def _access(self, target, name):
+        with target.using():
+            return target.access(_make_request(name))
+
+
+@test_target("ppic.aioresource:AsyncCachedResourceWrapper")
+class AsyncConditionalTests(_ConditionalTests, unittest.TestCase):
+    def _getResourceClass(self):
+        from ppic.aioresource import AsyncPYPIJSONResource
+        return AsyncPYPIJSONResource
+
+    def _fetch(self, resource, name, validators=None):
+        async def run():
+            async with resource.using():
+                return await resource.fetch(_make_request(name), validators)
+        return asyncio.run(run())
+
+    def _access(self, target, name):
+        async def run():
+            async with target.using():
+                return await target.access(_make_request(name))
+        return asyncio.run(run())
@@ -0,0 +1,146 @@
+# -*- coding:utf-8 -*-
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import contextlib
+from evilunit import test_function
+
+
+def _make_request(name, version):
+    from ppic import Request
+    return Request(name=name, previous_version=version, distribution=None)
+
+
+class FixedResource(object):
+    def __init__(self, versions):
+        self.versions = versions
+        self.accessed = []
+
+    def access(self, request):
+        self.accessed.append(request.name)
+        version = self.versions[request.name]
+        return {"info": {"name": request.name, "version": version}, "releases": {}}, True
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+PREVIOUS_REPORT = {
+    "packages": [
+        {"name": "foo", "_previous_version": "1.0", "version": "1.1", "last_modified": ""},
+        {"name": "bar", "_previous_version": "2.0", "version": "2.1", "last_modified": ""},
+        {"name": "boo", "_previous_version": "3.0", "version": "3.0", "last_modified": ""},
+    ],
+    "update_candidates": ["foo: '1.0' -> '1.1'", "bar: '2.0' -> '2.1'"],
+    "new_install_candidates": [],
+}
+
+
+@test_function("ppic.delta:collect_delta")
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "report.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, report):
+        with open(self.path, "w") as w:
+            json.dump(report, w)
+
+    def _options(self, cache_timeout=600):
+        from ppic import default_options
+        return default_options._replace(delay_time=0, cache_timeout=cache_timeout)
+
+    def test_only_changed_packages_are_fetched(self):
+        self._write(PREVIOUS_REPORT)
+        resource = FixedResource({"bar": "2.1", "new": "0.1"})
+        requests = [
+            _make_request("bar", "2.1"),  # upgraded
+            _make_request("foo", "1.0"),
+            _make_request("new", "0.1"),
+        ]
+        report, delta = self._callFUT(self.path, requests, self._options(), resource=resource)
+
+        self.assertEqual(sorted(resource.accessed), ["bar", "new"])
+        self.assertEqual([p["name"] for p in report["packages"]], ["bar", "foo", "new"])
+        self.assertEqual(delta["new_update_candidates"], [])
+        self.assertEqual(delta["resolved_update_candidates"], ["bar: '2.0' -> '2.1'"])
+        self.assertEqual(delta["added_packages"], ["new"])
+        self.assertEqual(delta["removed_packages"], ["boo"])
+        self.assertEqual(delta["rechecked"], ["bar", "new"])
+
+    def test_new_update_candidate(self):
+        resource = FixedResource({"boo": "3.1"})
+        previous = dict(PREVIOUS_REPORT, checked_at=int(time.time()) - 1000)
+        self._write(previous)  # expired
+        requests = [_make_request("boo", "3.0")]
+        report, delta = self._callFUT(self.path, requests, self._options(), resource=resource)
+        self.assertEqual(resource.accessed, ["boo"])
+        self.assertEqual(delta["new_update_candidates"], ["boo: '3.0' -> '3.1'"])
+
+    def test_checked_at_is_kept_while_reused(self):
+        checked_at = int(time.time()) - 100
+        self._write(dict(PREVIOUS_REPORT, checked_at=checked_at))
+        requests = [_make_request("foo", "1.0")]
+        report, _ = self._callFUT(self.path, requests, self._options(), resource=FixedResource({}))
+        self.assertEqual(report["checked_at"], checked_at)
+
+
+
+@test_function("ppic.delta:collect_delta")
+class CachedTests(unittest.TestCase):
+    """each package is expired by its own cache entry"""
+    day = 60 * 60 * 24
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "report.json")
+        self.now = int(time.time())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _callFUT(self, cached, versions):
+        from ppic import default_options
+        from ppic.cache import CacheEntry
+        from ppic.resource import CachedResourceWrapper
+        from ppic.tests.test_cache import DictStore
+        with open(self.path, "w") as w:
+            json.dump(dict(PREVIOUS_REPORT, checked_at=self.now - self.day), w)  # nightly
+        store = DictStore()
+        for name, (version, timestamp) in cached.items():
+            value = [{"info": {"name": name, "version": version}, "releases": {}}, True]
+            store.set(name, CacheEntry(value, timestamp))
+        self.resource = FixedResource(versions)
+        resource = CachedResourceWrapper(self.resource, None, 2 * self.day, backend=store)
+        requests = [_make_request("bar", "2.0"), _make_request("boo", "3.0"), _make_request("foo", "1.0")]
+        options = default_options._replace(delay_time=0, cache_timeout=2 * self.day)
+        return self._getTarget()(self.path, requests, options, usecache=True, resource=resource)
+
+    def test_only_expired_packages_are_fetched(self):
+        fetched_at = self.now - self.day - 10  # fetched for the previous report
+        expired_at = self.now - 3 * self.day
+        cached = {"bar": ("2.1", fetched_at), "boo": ("3.0", expired_at), "foo": ("1.1", fetched_at)}
+        report, delta = self._callFUT(cached, {"boo": "3.1"})
+        self.assertEqual(self.resource.accessed, ["boo"])
+        self.assertEqual(delta["rechecked"], ["boo"])
+        self.assertEqual(delta["new_update_candidates"], ["boo: '3.0' -> '3.1'"])
+        self.assertGreaterEqual(report["checked_at"], self.now)
+
+    def test_refreshed_after_the_report__rechecked_with_cache(self):
+        fetched_at = self.now - self.day - 10
+        cached = {"bar": ("2.1", fetched_at), "boo": ("3.0", fetched_at), "foo": ("1.2", self.now - 60)}
+        report, delta = self._callFUT(cached, {})
+        self.assertEqual(self.resource.accessed, [])  # served by cache
+        self.assertEqual(delta["rechecked"], ["foo"])
+        self.assertEqual(delta["new_update_candidates"], ["foo: '1.0' -> '1.2'"])
+
+    def test_not_cached__fetched(self):
+        report, delta = self._callFUT({}, {"bar": "2.1", "boo": "3.0", "foo": "1.1"})
+        self.assertEqual(sorted(self.resource.accessed), ["bar", "boo", "foo"])
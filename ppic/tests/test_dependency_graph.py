@@ -0,0 +1,217 @@
+# -*- coding:utf-8 -*-
+import unittest
+import contextlib
+from evilunit import test_target, test_function
+
+
+class Requirement(object):
+    def __init__(self, project_name):
+        self.project_name = project_name
+        self.key = project_name.lower()
+
+
+class Distribution(object):
+    def __init__(self, project_name, requires, version="1.0"):
+        self.project_name = project_name
+        self.key = project_name.lower()
+        self.version = version
+        self._requires = requires
+        self.called = 0
+
+    def requires(self):
+        self.called += 1
+        return [Requirement(name) for name in self._requires]
+
+
+class WorkingSet(object):
+    def __init__(self, *dists):
+        self.by_key = {d.key: d for d in dists}
+
+
+def _diamond():
+    # top -> left, right; left, right -> bottom
+    return WorkingSet(
+        Distribution("top", ["left", "right"]),
+        Distribution("left", ["bottom"]),
+        Distribution("right", ["bottom"]),
+        Distribution("bottom", []),
+    )
+
+
+def _cycle():
+    return WorkingSet(
+        Distribution("a", ["b"]),
+        Distribution("b", ["a"]),
+    )
+
+
+@test_target("ppic.dependency:DependencyGraph")
+class Tests(unittest.TestCase):
+    def _makeOne(self, working_set):
+        from ppic import RequestRepository
+        return self._getTarget()(RequestRepository(working_set))
+
+    def test_diamond__requires_is_called_once(self):
+        working_set = _diamond()
+        target = self._makeOne(working_set)
+        target.add(target.repository.find("top"))
+        target.add(target.repository.find("left"))
+        self.assertEqual(sorted(target.nodes.keys()), ["bottom", "left", "right", "top"])
+        self.assertEqual([d.called for d in working_set.by_key.values()], [1, 1, 1, 1])
+        self.assertEqual(target.edges["top"], ["left", "right"])
+
+    def test_cycle(self):
+        target = self._makeOne(_cycle())
+        target.add(target.repository.find("a"))
+        self.assertEqual(target.edges, {"a": ["b"], "b": ["a"]})
+
+    def test_not_installed(self):
+        working_set = WorkingSet(Distribution("a", ["missing"]))
+        target = self._makeOne(working_set)
+        target.add(target.repository.find("a"))
+        self.assertIsNone(target.nodes["missing"].distribution)
+
+
+@test_function("ppic:collect_dependencies")
+class CollectDependenciesTests(unittest.TestCase):
+    def _callFUT(self, working_set, name):
+        from ppic import RequestRepository
+        request = RequestRepository(working_set).find(name)
+        return self._getTarget()(request, {}, working_set)
+
+    def test_diamond(self):
+        result = self._callFUT(_diamond(), "top")
+        self.assertEqual(result, {"top": [{"left": ["bottom"]}, {"right": ["bottom"]}]})
+
+    def test_leaf(self):
+        self.assertIsNone(self._callFUT(_diamond(), "bottom"))
+
+    def test_cycle(self):
+        import json
+        result = self._callFUT(_cycle(), "a")
+        self.assertEqual(result, {"a": [{"b": ["a"]}]})
+        json.dumps(result)  # not circular
+
+    def test_not_installed(self):
+        result = self._callFUT(_diamond(), "missing")
+        self.assertEqual(result, {"missing": "UNKNOWN"})
+
+
+@test_function("ppic:collect_request_list")
+class CollectRequestListTests(unittest.TestCase):
+    def test_with_dependencies(self):
+        from ppic import default_options
+        options = default_options._replace(is_collect_all=False, see_dependencies=True)
+        result = self._callFUT(["top"], _diamond(), options)
+        self.assertEqual([r.name for r in result], ["bottom", "left", "right", "top"])
+
+    def test_cycle(self):
+        from ppic import default_options
+        options = default_options._replace(is_collect_all=False, see_dependencies=True)
+        result = self._callFUT(["a"], _cycle(), options)
+        self.assertEqual([r.name for r in result], ["a", "b"])
+
+
+@test_target("ppic.dependency:DependencyGraph")
+class RenderGraphTests(unittest.TestCase):
+    def _makeOne(self, working_set):
+        from ppic import RequestRepository
+        return self._getTarget()(RequestRepository(working_set))
+
+    def test_diamond__each_node_appears_once(self):
+        from ppic import RequestRepository
+        working_set = _diamond()
+        repository = RequestRepository(working_set)
+        target = self._makeOne(working_set)
+        requests = [repository.find(name) for name in ["bottom", "left", "right", "top"]]
+        result = target.render_graph(requests)
+        self.assertEqual([n["name"] for n in result["nodes"]], ["bottom", "left", "right", "top"])
+        self.assertEqual(result["nodes"][0]["version"], "1.0")
+        self.assertEqual(
+            dict(result["adjacency"]), {"left": ["bottom"], "right": ["bottom"], "top": ["left", "right"]}
+        )
+
+    def test_cycle(self):
+        from ppic import RequestRepository
+        working_set = _cycle()
+        target = self._makeOne(working_set)
+        result = target.render_graph([RequestRepository(working_set).find("a")])
+        self.assertEqual(dict(result["adjacency"]), {"a": ["b"]})
+
+
+@test_target("ppic.dependency:Expander")
+class ExpanderTests(unittest.TestCase):
+    def _makeOne(self, working_set, request_list):
+        from ppic import RequestRepository
+        from ppic.dependency import DependencyGraph
+        return self._getTarget()(DependencyGraph(RequestRepository(working_set)), request_list)
+
+    def _make_info(self, name, requires_dist):
+        from ppic import SuccessInfo, Request
+        request = Request(name=name, previous_version=None, distribution=None)
+        return SuccessInfo(request, {"info": {"name": name, "requires_dist": requires_dist}, "releases": {}})
+
+    def test_not_installed__dependencies_are_found(self):
+        info = self._make_info("app", ["top (>=1.0)", "new-package", 'pytest; extra == "test"'])
+        target = self._makeOne(_diamond(), [info.request])
+        result = target(info)
+        self.assertEqual(
+            sorted((r.name, r.previous_version) for r in result),
+            [("bottom", "1.0"), ("left", "1.0"), ("new-package", None), ("right", "1.0"), ("top", "1.0")]
+        )
+        self.assertEqual(target(info), [])  # only once
+
+    def test_already_requested__not_found(self):
+        from ppic import RequestRepository
+        info = self._make_info("app", ["left", "Bottom"])
+        repository = RequestRepository(_diamond())
+        target = self._makeOne(_diamond(), [info.request, repository.find("bottom")])
+        self.assertEqual([r.name for r in target(info)], ["left"])
+
+
+class DependentResource(object):
+    def __init__(self, requires_dist):
+        self.requires_dist = requires_dist
+
+    def access(self, request):
+        info = {"name": request.name, "version": "0.1", "requires_dist": self.requires_dist.get(request.name)}
+        return {"info": info, "releases": {}}, True
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self
+
+
+@test_function("ppic:run")
+class RunTests(unittest.TestCase):
+    def _callFUT(self, argv):
+        from ppic import parse, options_from_args
+        parser = parse(argv + ["--no-cache", "--delay", "0"])
+        resource = DependentResource({"app": ["libb"], "libb": ["libd (>=1.0)"]})
+        return self._getTarget()(
+            parser, options_from_args(parser), working_set=WorkingSet(), resource=resource
+        )
+
+    def test_not_installed__dependencies_found_while_fetching(self):
+        result = self._callFUT(["app", "--dependency"])
+        self.assertEqual([p["name"] for p in result["packages"]], ["app", "libb", "libd"])
+        self.assertEqual(result["dependencies"], [{"app": [{"libb": ["libd"]}]}, {"libb": ["libd"]}])
+
+    def test_not_installed__graph_format(self):
+        result = self._callFUT(["app", "--dependency", "--dependency-format", "graph"])
+        dependencies = result["dependencies"]
+        self.assertEqual([n["name"] for n in dependencies["nodes"]], ["app", "libb", "libd"])
+        self.assertEqual(dict(dependencies["adjacency"]), {"app": ["libb"], "libb": ["libd"]})
+
+    def test_not_found__unknown(self):
+        from ppic import parse, options_from_args
+
+        class NotFoundResource(DependentResource):
+            def access(self, request):
+                return "404 Not Found", False
+
+        parser = parse(["app", "--dependency", "--no-cache", "--delay", "0"])
+        result = self._getTarget()(
+            parser, options_from_args(parser), working_set=WorkingSet(), resource=NotFoundResource({})
+        )
+        self.assertEqual(result["dependencies"], [{"app": "UNKNOWN"}])
@@ -0,0 +1,65 @@
+# -*- coding:utf-8 -*-
+import os.path
+import shutil
+import tempfile
+import unittest
+from evilunit import test_target, test_function
+
+
+@test_function("ppic.environment:parse_requirement")
+class ParseRequirementTests(unittest.TestCase):
+    def test_it(self):
+        result = self._callFUT("zope.interface (>=3.8.0)")
+        self.assertEqual(result, ("zope.interface", "zope.interface"))
+
+    def test_key_is_safe_name(self):
+        result = self._callFUT("typing_extensions>=4.0")
+        self.assertEqual(result, ("typing_extensions", "typing-extensions"))
+
+    def test_extra__ignored(self):
+        self.assertIsNone(self._callFUT('pytest; extra == "testing"'))
+
+
+@test_function("ppic.environment:canonicalize_name")
+class CanonicalizeNameTests(unittest.TestCase):
+    def test_it(self):
+        for name in ["zope.interface", "Zope.Interface", "zope-interface", "zope_interface", "zope__interface"]:
+            self.assertEqual(self._callFUT(name), "zope-interface")
+
+
+@test_target("ppic.environment:MetadataWorkingSet")
+class WorkingSetTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, path, content):
+        path = os.path.join(self.tmpdir, path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as w:
+            w.write(content)
+
+    def test_it(self):
+        self._write(
+            "foo_bar-0.1.dist-info/METADATA",
+            "Metadata-Version: 2.1\nName: foo_bar\nVersion: 0.1\nRequires-Dist: baz\n"
+            "Requires-Dist: pytest; extra == 'testing'\n\ndescription\nName: xxx\n"
+        )
+        self._write("baz-1.0-py3.4.egg-info", "Metadata-Version: 1.0\nName: baz\nVersion: 1.0\n")
+        self._write("broken-1.0.dist-info/RECORD", "")
+
+        target = self._makeOne([self.tmpdir])
+        self.assertEqual(sorted(target.by_key.keys()), ["baz", "foo-bar"])
+
+        dist = target.by_key["foo-bar"]
+        self.assertEqual((dist.project_name, dist.version), ("foo_bar", "0.1"))
+        self.assertEqual([r.key for r in dist.requires()], ["baz"])
+
+    def test_first_one_is_used(self):
+        self._write("a/foo-0.2.dist-info/METADATA", "Name: foo\nVersion: 0.2\n")
+        self._write("b/foo-0.1.dist-info/METADATA", "Name: foo\nVersion: 0.1\n")
+        target = self._makeOne([os.path.join(self.tmpdir, "a"), os.path.join(self.tmpdir, "b")])
+        self.assertEqual(target.by_key["foo"].version, "0.2")
@@ -0,0 +1,106 @@
+# -*- coding:utf-8 -*-
+import os.path
+import json
+import shutil
+import tempfile
+import unittest
+from evilunit import test_target
+
+
+def _make_request(name):
+    from ppic import Request
+    return Request(name=name, previous_version=None, distribution=None)
+
+
+def _make_document(name, version):
+    return {
+        "info": {"name": name, "version": version, "description": "..."},
+        "releases": {version: [{"upload_time": "2015-01-01T00:00:00", "size": 1}]}
+    }
+
+
+class _Base(object):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+@test_target("ppic.resource:LocalDirectoryResource")
+class LocalDirectoryResourceTests(_Base, unittest.TestCase):
+    def _write(self, path, doc):
+        path = os.path.join(self.tmpdir, path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as w:
+            json.dump(doc, w)
+
+    def test_found(self):
+        self._write("foo.json", _make_document("foo", "0.1"))
+        self._write("pypi/Bar/json", _make_document("Bar", "0.2"))
+        target = self._makeOne(self.tmpdir)
+        with target.using():
+            foo, status = target.access(_make_request("foo"))
+            self.assertTrue(status)
+            self.assertEqual(foo["info"]["version"], "0.1")
+            bar, status = target.access(_make_request("Bar"))
+            self.assertEqual(bar["releases"], {"0.2": [{"upload_time": "2015-01-01T00:00:00"}]})
+
+    def test_not_found(self):
+        target = self._makeOne(self.tmpdir)
+        with target.using():
+            _, status = target.access(_make_request("foo"))
+        self.assertFalse(status)
+
+
+@test_target("ppic.resource:DumpFileResource")
+class DumpFileResourceTests(_Base, unittest.TestCase):
+    def _write_dump(self, *docs):
+        path = os.path.join(self.tmpdir, "dump.jsonl")
+        with open(path, "w") as w:
+            for doc in docs:
+                w.write(json.dumps(doc))
+                w.write("\n")
+        return path
+
+    def test_found(self):
+        path = self._write_dump(_make_document("foo", "0.1"), _make_document("Bar", "0.2"))
+        target = self._makeOne(path)
+        with target.using():
+            foo, status = target.access(_make_request("foo"))
+            self.assertEqual(foo["info"]["version"], "0.1")
+            bar, status = target.access(_make_request("bar"))
+            self.assertEqual(bar["info"]["version"], "0.2")
+            _, status = target.access(_make_request("boo"))
+            self.assertFalse(status)
+
+    def test_found__by_canonical_name(self):
+        path = self._write_dump(_make_document("zope.interface", "4.0"))
+        target = self._makeOne(path)
+        with target.using():
+            doc, status = target.access(_make_request("Zope_Interface"))
+        self.assertTrue(status)
+        self.assertEqual(doc["info"]["version"], "4.0")
+
+    def test_index_is_reused(self):
+        path = self._write_dump(_make_document("foo", "0.1"))
+        with self._makeOne(path).using():
+            pass
+        self.assertTrue(os.path.exists(path + ".idx"))
+
+        target = self._makeOne(path)
+        target.build_index = None  # not called
+        with target.using():
+            foo, _ = target.access(_make_request("foo"))
+        self.assertEqual(foo["info"]["version"], "0.1")
+
+    def test_index_is_rebuilt_if_dump_is_changed(self):
+        path = self._write_dump(_make_document("foo", "0.1"))
+        with self._makeOne(path).using():
+            pass
+        path = self._write_dump(_make_document("foo", "0.1"), _make_document("bar", "0.2"))
+        target = self._makeOne(path)
+        with target.using():
+            _, status = target.access(_make_request("bar"))
+        self.assertTrue(status)
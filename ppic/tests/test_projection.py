@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+import unittest
+from evilunit import test_function
+
+
+@test_function("ppic.projection:project_info")
+class Tests(unittest.TestCase):
+    def test_it(self):
+        data = {
+            "info": {"name": "foo", "version": "0.2", "description": "long long text", "stable_version": None},
+            "releases": {
+                "0.1": [
+                    {"upload_time": "2014-12-04T23:16:25", "url": "http://example.com/foo-0.1.tar.gz"},
+                    {"upload_time": "2014-12-05T23:16:25", "url": "http://example.com/foo-0.1.zip"},
+                ],
+                "0.2": [],
+            },
+            "urls": [{"url": "http://example.com/foo-0.2.tar.gz"}],
+        }
+        result = self._callFUT(data)
+        expected = {
+            "info": {"name": "foo", "version": "0.2", "stable_version": None, "requires_dist": None},
+            "releases": {"0.1": [{"upload_time": "2014-12-04T23:16:25"}], "0.2": []}
+        }
+        self.assertEqual(result, expected)
+
+    def test_used_by_success_info(self):
+        from ppic import SuccessInfo, Request
+        data = {
+            "info": {"name": "foo", "version": "0.2"},
+            "releases": {"0.2": [{"upload_time": "2014-12-04T23:16:25", "size": 100}]},
+        }
+        request = Request(name="foo", previous_version="0.1", distribution=None)
+        expected = SuccessInfo(request, data).normalized_format()
+        result = SuccessInfo(request, self._callFUT(data)).normalized_format()
+        self.assertEqual(result, expected)
+
+
+@test_function("ppic.projection:load_projected")
+class StreamingTests(unittest.TestCase):
+    def _make_document(self):
+        return {
+            "info": {
+                "name": "fóó",
+                "version": "0.2",
+                "description": "日本語 text " * 50,
+                "downloads": {"last_day": 12345}
+            },
+            "last_serial": 1234567,
+            "releases": {
+                "0.{}".format(i): [
+                    {"upload_time": "2014-12-{:02d}T23:16:25".format(i + 1), "size": 1000 + j, "md5": "x" * 32}
+                    for j in range(i % 3)
+                ]
+                for i in range(20)
+            },
+            "urls": [{"url": "http://example.com/foo-0.2.tar.gz", "size": 10}],
+        }
+
+    def _callFUT(self, data, chunk_size, as_text=False):
+        import io
+        import json
+        text = json.dumps(data, indent=1, ensure_ascii=False)
+        fp = io.StringIO(text) if as_text else io.BytesIO(text.encode("utf-8"))
+        return self._getTarget()(fp, chunk_size=chunk_size)
+
+    def test_same_as_project_info(self):
+        from ppic.projection import project_info
+        data = self._make_document()
+        for chunk_size in [1, 3, 7, 64, 64 * 1024]:
+            result = self._callFUT(data, chunk_size)
+            self.assertEqual(result, project_info(data), chunk_size)
+
+    def test_text_stream(self):
+        from ppic.projection import project_info
+        data = self._make_document()
+        self.assertEqual(self._callFUT(data, 5, as_text=True), project_info(data))
+
+    def test_number_on_chunk_boundary(self):
+        data = {"last_serial": 1234567, "info": {"name": "foo", "version": 1.25}}
+        result = self._callFUT(data, 2)
+        self.assertEqual(result["info"]["version"], 1.25)
+
+    def test_empty_object(self):
+        from ppic.projection import project_info
+        data = {"info": {}, "releases": {}}
+        self.assertEqual(self._callFUT(data, 1), project_info(data))
+
+    def test_broken_document(self):
+        import io
+        with self.assertRaises(ValueError):
+            self._getTarget()(io.BytesIO(b'{"info": {"name": "foo"'), chunk_size=4)
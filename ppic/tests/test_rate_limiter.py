@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+import unittest
+from evilunit import test_target
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, n):
+        self.slept.append(n)
+        self.now += n
+
+
+@test_target("ppic.resource:RateLimiter")
+class Tests(unittest.TestCase):
+    def _makeOne(self, rate, clock):
+        return self._getTarget()(rate, clock=clock, sleep=clock.sleep)
+
+    def test_first_access__not_waiting(self):
+        clock = FakeClock()
+        target = self._makeOne(10, clock)
+        self.assertEqual(target.acquire(), 0)
+        self.assertEqual(clock.slept, [])
+
+    def test_burst_access__waiting_each_interval(self):
+        clock = FakeClock()
+        target = self._makeOne(10, clock)
+        for i in range(3):
+            target.acquire()
+        self.assertEqual([round(x, 3) for x in clock.slept], [0.1, 0.1])
+
+    def test_queued_workers__reserve_successive_slots(self):
+        clock = FakeClock()
+        target = self._makeOne(10, clock)
+        # three workers arrive at the same time, no one has slept yet.
+        target.sleep = lambda n: None
+        waits = [target.acquire() for _ in range(3)]
+        self.assertEqual([round(x, 3) for x in waits], [0, 0.1, 0.2])
+
+    def test_idle__tokens_are_refilled(self):
+        clock = FakeClock()
+        target = self._makeOne(10, clock)
+        target.acquire()
+        clock.now += 1.0
+        self.assertEqual(target.acquire(), 0)
+
+    def test_zero_delay__unlimited(self):
+        clock = FakeClock()
+        target = self._getTarget().from_delay_time(0, clock=clock, sleep=clock.sleep)
+        for i in range(3):
+            target.acquire()
+        self.assertEqual(clock.slept, [])
+
+    def test_throttled__rate_is_halved(self):
+        clock = FakeClock()
+        target = self._makeOne(10, clock)
+        target.on_throttled()
+        self.assertEqual(target.rate, 5)
+        target.on_throttled()
+        self.assertEqual(target.rate, 2.5)
+
+    def test_throttled__not_below_min_rate(self):
+        clock = FakeClock()
+        target = self._makeOne(1, clock)
+        for i in range(10):
+            target.on_throttled()
+        self.assertEqual(target.rate, target.min_rate)
+
+    def test_success__rate_is_recovered_up_to_initial_rate(self):
+        clock = FakeClock()
+        target = self._makeOne(10, clock)
+        target.on_throttled()
+        target.on_success()
+        self.assertGreater(target.rate, 5)
+        for i in range(100):
+            target.on_success()
+        self.assertEqual(target.rate, 10)
+
+    def test_unlimited__throttled_and_recovered(self):
+        clock = FakeClock()
+        target = self._getTarget().from_delay_time(0, clock=clock, sleep=clock.sleep)
+        target.on_throttled()
+        self.assertEqual(target.rate, target.throttled_rate * target.decrease)
+        for i in range(100):
+            target.on_success()
+        self.assertIsNone(target.rate)
+
+    def test_pause__all_workers_wait(self):
+        clock = FakeClock()
+        target = self._makeOne(None, clock)
+        target.pause(2.0)
+        self.assertEqual(target.acquire(), 2.0)
+        self.assertEqual(target.acquire(), 0)
@@ -34,6 +34,20 @@ class FindTests(unittest.TestCase):
         self.assertEqual(result.name, "python-pip")  # name is project name
         self.assertEqual(result.previous_version, mockin_pip.version)  # important
 
+    def test_found__by_canonical_name(self):
+        class zope_interface:
+            project_name = "zope.interface"
+            version = "4.0"
+
+        class WorkingSet:
+            by_key = {"zope.interface": zope_interface}
+
+        target = self._makeOne(WorkingSet())
+        for name in ["Zope.Interface", "zope-interface", "zope_interface"]:
+            result = target.find(name)
+            self.assertEqual(result.name, "zope.interface")
+            self.assertEqual(result.previous_version, "4.0")
+
 
 @test_target("ppic:RequestRepository")
 class CollectInstalledPackagesTests(unittest.TestCase):
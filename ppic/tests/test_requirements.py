@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+import os.path
+import shutil
+import tempfile
+import unittest
+from evilunit import test_function
+
+
+@test_function("ppic.requirements:parse_requirements_file")
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w") as w:
+            w.write(content)
+        return path
+
+    def _callFUT(self, path):
+        return [tuple(r[:2]) for r in self._getTarget()(path)]
+
+    def test_it(self):
+        path = self._write(
+            "requirements.txt", """\
+# comment
+SQLAlchemy==0.9.7
+zope.interface == 4.1.1  # inline comment
+requests[security]==2.5.1 ; python_version >= "2.7"
+six>=1.8
+-e git+https://example.com/foo.git#egg=foo
+--index-url https://example.com/simple
+
+cryptography==0.8 \\
+    --hash=sha256:aaaa \\
+    --hash=sha256:bbbb
+"""
+        )
+        result = self._callFUT(path)
+        expected = [
+            ("SQLAlchemy", "0.9.7"),
+            ("zope.interface", "4.1.1"),
+            ("requests", "2.5.1"),
+            ("six", None),
+            ("cryptography", "0.8"),
+        ]
+        self.assertEqual(result, expected)
+
+    def test_included(self):
+        self._write("base.txt", "six==1.8\n")
+        path = self._write("requirements.txt", "-r base.txt\nWebOb==1.4\n")
+        self.assertEqual(self._callFUT(path), [("six", "1.8"), ("WebOb", "1.4")])
+
+    def test_included__option_forms(self):
+        self._write("base.txt", "six==1.8\n")
+        for line in ["-rbase.txt", "-r=base.txt", "--requirement base.txt", "--requirement=base.txt"]:
+            path = self._write("requirements.txt", line + "\n")
+            self.assertEqual(self._callFUT(path), [("six", "1.8")], line)
+
+
+@test_function("ppic:collect_request_list")
+class CollectRequestListTests(unittest.TestCase):
+    def test_pinned_version_is_used(self):
+        from ppic import default_options, RequestBuilder
+
+        class WorkingSet(object):
+            by_key = {}
+
+        options = default_options._replace(is_collect_all=False)
+        requirements = iter([RequestBuilder().pinned("foo", "0.1"), RequestBuilder().pinned("bar", "0.2")])
+        result = self._callFUT(["foo"], WorkingSet(), options, requirements=requirements)
+        self.assertEqual([(r.name, r.previous_version) for r in result], [("bar", "0.2"), ("foo", "0.1")])
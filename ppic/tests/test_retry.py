@@ -0,0 +1,207 @@
+# -*- coding:utf-8 -*-
+import json
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from evilunit import test_target, test_function
+
+
+def _make_request(name):
+    from ppic import Request
+    return Request(name=name, previous_version=None, distribution=None)
+
+
+@test_function("ppic.resource:parse_retry_after")
+class ParseRetryAfterTests(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(self._callFUT("120"), 120)
+
+    def test_http_date__past(self):
+        self.assertEqual(self._callFUT("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+    def test_invalid(self):
+        self.assertIsNone(self._callFUT("soon"))
+        self.assertIsNone(self._callFUT(None))
+
+
+class FakeError(Exception):
+    def __init__(self, code=None, headers=None):
+        self.code = code
+        self.headers = headers or {}
+
+
+class FakeLimiter(object):
+    def __init__(self):
+        self.throttled = 0
+        self.paused = []
+
+    def on_throttled(self):
+        self.throttled += 1
+
+    def pause(self, seconds):
+        self.paused.append(seconds)
+
+
+@test_target("ppic.resource:RetryPolicy")
+class RetryPolicyTests(unittest.TestCase):
+    def _makeOne(self, retries=3):
+        return self._getTarget()(retries=retries, base=1.0, cap=10.0, random=lambda: 1.0)
+
+    def test_backoff__exponential(self):
+        target = self._makeOne()
+        self.assertEqual([target.backoff(i) for i in range(5)], [1, 2, 4, 8, 10])
+
+    def test_not_found__giving_up(self):
+        target = self._makeOne()
+        self.assertIsNone(target.handle(FakeError(404), 0, FakeLimiter()))
+
+    def test_network_error__retried(self):
+        target = self._makeOne()
+        self.assertEqual(target.handle(OSError("timed out"), 1, FakeLimiter()), 2)
+
+    def test_throttled__retry_after_is_honoured(self):
+        target = self._makeOne()
+        limiter = FakeLimiter()
+        wait = target.handle(FakeError(429, {"retry-after": "3"}), 0, limiter)
+        self.assertEqual(wait, 3)
+        self.assertEqual(limiter.throttled, 1)
+        self.assertEqual(limiter.paused, [3])
+
+    def test_too_many_retries__giving_up(self):
+        target = self._makeOne(retries=2)
+        limiter = FakeLimiter()
+        self.assertIsNone(target.handle(FakeError(503), 2, limiter))
+        self.assertEqual(limiter.throttled, 1)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = None  # path -> number of 503 responses, before success
+    truncated = None  # path -> number of responses closed in the middle of body, before success
+
+    def do_GET(self):
+        if self.truncated.get(self.path, 0) > 0:
+            self.truncated[self.path] -= 1
+            self.send_response(200)
+            if self.path.startswith("/chunked/"):
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self.wfile.write(b"3e8\r\n{\"info\": {")
+            else:
+                self.send_header("Content-Length", "1000")
+                self.end_headers()
+                self.wfile.write(b"{\"info\": {")
+            self.close_connection = True
+            return
+        if self.failures.get(self.path, 0) > 0:
+            self.failures[self.path] -= 1
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"info": {"name": "foo", "version": "0.1"}, "releases": {}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _RetryTests(object):
+    def setUp(self):
+        from ppic.stats import Stats
+        handler = type("Handler", (FlakyHandler, ), {"failures": {}, "truncated": {}})
+        self.failures = handler.failures
+        self.truncated = handler.truncated
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01, ), daemon=True)
+        self.thread.start()
+        self.stats = Stats()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _makeOne(self, retries=3):
+        from ppic.resource import RetryPolicy
+        urlfmt = "http://127.0.0.1:{}/pypi/{{name}}/json".format(self.server.server_address[1])
+        return self._getTarget()(
+            0, urlfmt=urlfmt, stats=self.stats, retry_policy=RetryPolicy(retries=retries, base=0.001)
+        )
+
+    def test_retried(self):
+        self.failures["/pypi/foo/json"] = 2
+        target = self._makeOne()
+        result = self._access(target, "foo")
+        self.assertTrue(result[1])
+        counters = self.stats.as_dict()["counters"]
+        self.assertEqual(counters["retries"], 2)
+        self.assertEqual(counters["throttled"], 2)
+
+    def test_giving_up(self):
+        self.failures["/pypi/foo/json"] = 3
+        target = self._makeOne(retries=2)
+        result = self._access(target, "foo")
+        self.assertEqual(result, ("HTTP Error 503: Service Unavailable", False))
+        self.assertEqual(self.stats.as_dict()["counters"]["failures"], 1)
+
+    def test_truncated_body__retried(self):
+        for path in ["/pypi/foo/json", "/chunked/foo/json"]:
+            self.truncated[path] = 1
+            target = self._makeOne()
+            target.urlfmt = "http://127.0.0.1:{}{}".format(
+                self.server.server_address[1], path.replace("foo", "{name}")
+            )
+            result = self._access(target, "foo")
+            self.assertEqual(result[0]["info"]["version"], "0.1")
+        self.assertEqual(self.stats.as_dict()["counters"]["retries"], 2)
+
+    def test_truncated_body__giving_up(self):
+        self.truncated["/pypi/foo/json"] = 2
+        target = self._makeOne(retries=1)
+        result = self._access(target, "foo")
+        self.assertFalse(result[1])
+
+    def test_connection_refused__failure(self):
+        target = self._makeOne(retries=1)
+        target.urlfmt = "http://127.0.0.1:1/{name}/json"
+        result = self._access(target, "foo")
+        self.assertFalse(result[1])
+
+
+@test_target("ppic.resource:PYPIJSONResource")
+class PYPIJSONResourceTests(_RetryTests, unittest.TestCase):
+    def _access(self, target, name):
+        return target.access(_make_request(name))
+
+
+@test_target("ppic.aioresource:AsyncPYPIJSONResource")
+class AsyncPYPIJSONResourceTests(_RetryTests, unittest.TestCase):
+    def _access(self, target, name):
+        async def run():
+            async with target.using():
+                return await target.access(_make_request(name))
+        return asyncio.run(run())
+
+
+@test_target("ppic.resource:CachedResourceWrapper")
+class NegativeCacheTests(unittest.TestCase):
+    def test_failure__expired_shortly(self):
+        import time
+        from ppic.cache import CacheEntry
+        from ppic.tests.test_cache import CountingResource, DictStore
+        store = DictStore()
+        now = int(time.time())
+        store.set("ok", CacheEntry(["ok", True], now - 120))
+        store.set("ng", CacheEntry(["ng", False], now - 120))
+        resource = CountingResource()
+        target = self._getTarget()(resource, None, 600, backend=store, negative_timeout=60)
+        with target.using():
+            self.assertEqual(target.access(_make_request("ok")), ["ok", True])
+            self.assertEqual(target.access(_make_request("ng")), ("ng", True))
+        self.assertEqual(resource.count, 1)
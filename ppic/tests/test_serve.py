@@ -0,0 +1,170 @@
+# -*- coding:utf-8 -*-
+import io
+import os.path
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from evilunit import test_target, test_function
+from ppic.tests.test_collect_environment_reports import CountingResource
+
+
+def _make_env(root, name, packages):
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    for package, version in packages:
+        distinfo = os.path.join(path, "{}-{}.dist-info".format(package, version))
+        os.makedirs(distinfo)
+        with open(os.path.join(distinfo, "METADATA"), "w") as w:
+            w.write("Name: {}\nVersion: {}\n".format(package, version))
+    return path
+
+
+@test_target("ppic.serve:WorkingSetCache")
+class WorkingSetCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cached_until_directory_is_changed(self):
+        path = _make_env(self.tmpdir, "env", [("foo", "1.0")])
+        target = self._makeOne()
+        working_set = target([path])
+        self.assertIs(target([path]), working_set)
+
+        _make_env(self.tmpdir, "env", [("bar", "1.0")])
+        os.utime(path, (0, 0))  # mtime resolution of some filesystems is coarse
+        result = target([path])
+        self.assertIsNot(result, working_set)
+        self.assertEqual(sorted(result.by_key.keys()), ["bar", "foo"])
+
+
+@test_target("ppic.serve:App")
+class AppTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _makeOne(self):
+        from ppic import default_options
+        app = self._getTarget()(default_options._replace(delay_time=0))
+        app.resource = self.resource = CountingResource()
+        return app
+
+    def test_query(self):
+        path = _make_env(self.tmpdir, "env", [("foo", "1.0")])
+        target = self._makeOne()
+        args = target.parse_query([("env", path), ("installed", ""), ("package", "bar")])
+        content_type, body = target.query(args)
+        self.assertEqual(content_type, "application/json")
+        result = json.loads(body.decode("utf-8"))
+        self.assertEqual(result["environments"][0]["update_candidates"], ["foo: '1.0' -> '2.0'"])
+        self.assertEqual(result["environments"][0]["new_install_candidates"], ["bar: '' -> '2.0'"])
+
+    def test_asyncio__ignored(self):
+        from ppic import default_options
+        target = self._getTarget()(default_options._replace(use_asyncio=True))
+        self.assertFalse(target.options.use_asyncio)
+        target.resource = CountingResource()
+        _, body = target.query(target.parse_query([("package", "bar")]))
+        self.assertEqual(json.loads(body.decode("utf-8"))["new_install_candidates"], ["bar: '' -> '2.0'"])
+
+    def test_invalid_query(self):
+        from ppic.serve import QueryError
+        target = self._makeOne()
+        with self.assertRaises(QueryError):
+            target.parse_query([("bogus", "")])
+        with self.assertRaises(QueryError):
+            target.namespace({"bogus": True})
+
+    def test_namespace__parsed_as_command_line(self):
+        target = self._makeOne()
+        args = target.namespace(
+            {"package": "foo", "installed": True, "stats": False, "shard": "1/2", "env": []}
+        )
+        self.assertEqual(args.package, ["foo"])
+        self.assertTrue(args.installed)
+        self.assertFalse(args.stats)
+        self.assertEqual(args.shard, (1, 2))
+        self.assertEqual(target.namespace({"package": ["foo", "-bar"]}).package, ["foo", "-bar"])
+
+    def test_namespace__invalid_value(self):
+        from ppic.serve import QueryError
+        target = self._makeOne()
+        for options in [
+            {"shard": [1, 2]},
+            {"shard": "x"},
+            {"installed": "yes"},
+            {"format": "xml"},
+            {"package": {"foo": 1}},
+            {"package": True},
+        ]:
+            with self.assertRaises(QueryError):
+                target.namespace(options)
+
+    def test_files_are_not_touched_by_query(self):
+        from ppic.serve import QueryError
+        target = self._makeOne()
+        for k, v in [
+            ("save_report", "/tmp/x.json"), ("since", "/etc/passwd"), ("requirements", ["/etc/passwd"])
+        ]:
+            with self.assertRaises(QueryError):
+                target.namespace({k: v})
+        with self.assertRaises(QueryError):
+            target.parse_query([("save_report", "/tmp/x.json")])
+
+
+@test_function("ppic.serve:make_server")
+class ServerTests(unittest.TestCase):
+    def setUp(self):
+        from ppic import default_options
+        from ppic.serve import App
+        self.tmpdir = tempfile.mkdtemp()
+        app = App(default_options._replace(delay_time=0))
+        app.resource = CountingResource()
+        self.server = self._callFUT(app, socket_path=os.path.join(self.tmpdir, "ppic.sock"))
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01, ), daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_client(self):
+        from ppic import parse
+        from ppic.client import request_server
+        out = io.StringIO()
+        url = "unix://" + os.path.join(self.tmpdir, "ppic.sock")
+        status = request_server(url, parse(["foo", "--format", "ndjson"]), out)
+        self.assertEqual(status, 0)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(lines[0]["name"], "foo")
+        self.assertEqual(lines[-1]["new_install_candidates"], ["foo: '' -> '2.0'"])
+
+    def test_client__sharded(self):
+        from ppic import parse
+        from ppic.client import request_server
+        out = io.StringIO()
+        url = "unix://" + os.path.join(self.tmpdir, "ppic.sock")
+        status = request_server(url, parse(["foo", "--shard", "1/1"]), out)
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(out.getvalue())["new_install_candidates"], ["foo: '' -> '2.0'"])
+
+    def test_client__report_is_saved_by_client(self):
+        from ppic import parse
+        from ppic.client import request_server
+        path = os.path.join(self.tmpdir, "report.json")
+        url = "unix://" + os.path.join(self.tmpdir, "ppic.sock")
+        status = request_server(url, parse(["foo", "--save-report", path, "--stats"]), io.StringIO())
+        self.assertEqual(status, 0)
+        with open(path) as r:
+            report = json.load(r)
+        self.assertEqual(report["new_install_candidates"], ["foo: '' -> '2.0'"])
+        self.assertIn("checked_at", report)
+        self.assertNotIn("stats", report)
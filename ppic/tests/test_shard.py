@@ -0,0 +1,99 @@
+# -*- coding:utf-8 -*-
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from evilunit import test_function
+
+
+def _make_request(name, version=None):
+    from ppic import Request
+    return Request(name=name, previous_version=version, distribution=None)
+
+
+def _render(requests, versions):
+    from ppic import SuccessInfo, FailureInfo, rendering_info_list
+    infos = []
+    for request in requests:
+        version = versions.get(request.name)
+        if version is None:
+            infos.append(FailureInfo(request, "404 Not Found"))
+        else:
+            info = {"info": {"name": request.name, "version": version}, "releases": {}}
+            infos.append(SuccessInfo(request, info))
+    return rendering_info_list(infos)
+
+
+@test_function("ppic.shard:parse_shard")
+class ParseShardTests(unittest.TestCase):
+    def test_it(self):
+        self.assertEqual(self._callFUT("2/3"), (2, 3))
+
+    def test_invalid(self):
+        for text in ["0/3", "4/3", "1", "a/b", "1/0"]:
+            with self.assertRaises(ValueError):
+                self._callFUT(text)
+
+
+@test_function("ppic.shard:select_shard")
+class SelectShardTests(unittest.TestCase):
+    def test_partitioned(self):
+        requests = [_make_request("pkg{}".format(i)) for i in range(100)]
+        shards = [self._callFUT(requests, i, 3) for i in range(1, 4)]
+        self.assertEqual(sorted(r.name for shard in shards for r in shard), sorted(r.name for r in requests))
+        self.assertTrue(all(len(shard) > 0 for shard in shards))
+
+    def test_same_shard__for_same_canonical_name(self):
+        from ppic.shard import shard_of
+        self.assertEqual(shard_of("Zope.Interface", 7), shard_of("zope_interface", 7))
+
+
+@test_function("ppic.shard:merge_reports")
+class MergeReportsTests(unittest.TestCase):
+    def test_same_as_unsharded(self):
+        from ppic.shard import select_shard
+        requests = [
+            _make_request("bar", "1.0"),
+            _make_request("boo"),
+            _make_request("foo", "1.0"),
+            _make_request("new"),
+            _make_request("same", "2.0"),
+        ]
+        versions = {"bar": "1.1", "foo": "1.2", "new": "0.1", "same": "2.0"}
+        reports = [_render(select_shard(requests, i, 2), versions) for i in (1, 2)]
+        result = self._callFUT(reports)
+        self.assertEqual(json.dumps(result), json.dumps(_render(requests, versions)))
+
+    def test_duplicated_in_shards__merged(self):
+        reports = [
+            _render([_make_request("foo", "1.0")], {"foo": "1.1"}),
+            _render([_make_request("Foo", "1.0")], {"Foo": "1.1"}),
+        ]
+        result = self._callFUT(reports)
+        self.assertEqual(len(result["packages"]), 1)
+        self.assertEqual(result["update_candidates"], ["foo: '1.0' -> '1.1'"])
+
+    def test_checked_at__oldest(self):
+        reports = [_render([], {}), _render([], {})]
+        reports[0]["checked_at"] = 200
+        reports[1]["checked_at"] = 100
+        self.assertEqual(self._callFUT(reports)["checked_at"], 100)
+
+
+@test_function("ppic.shard:load_output")
+class LoadOutputTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ndjson(self):
+        path = os.path.join(self.tmpdir, "shard.ndjson")
+        with open(path, "w") as w:
+            w.write(json.dumps({"name": "foo", "version": "0.1", "last_modified": ""}) + "\n")
+            w.write(json.dumps({"name": "bar", "error": "404"}) + "\n")
+            w.write(json.dumps({"update_candidates": [], "new_install_candidates": ["foo"]}) + "\n")
+        result = self._callFUT(path)
+        self.assertEqual([e["name"] for e in result["packages"]], ["foo", "bar"])
@@ -0,0 +1,77 @@
+# -*- coding:utf-8 -*-
+import unittest
+from evilunit import test_target, test_function
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@test_target("ppic.stats:Stats")
+class StatsTests(unittest.TestCase):
+    def test_phase(self):
+        clock = FakeClock()
+        target = self._getTarget()(clock=clock)
+        with target.phase("fetch"):
+            clock.now += 1.5
+        with target.phase("fetch"):
+            clock.now += 0.5
+        self.assertEqual(target.as_dict()["phases"], {"fetch": 2.0})
+
+    def test_counters(self):
+        target = self._getTarget()()
+        target.incr("cache_hit")
+        target.incr("cache_hit")
+        target.incr("bytes_received", 100)
+        self.assertEqual(target.as_dict()["counters"], {"cache_hit": 2, "bytes_received": 100})
+
+    def test_latency_percentiles(self):
+        target = self._getTarget()()
+        for i in range(100, 0, -1):
+            target.observe(i)
+        result = target.as_dict()["requests"]
+        self.assertEqual(result["count"], 100)
+        self.assertEqual(result["p50"], 51)
+        self.assertEqual(result["p99"], 99)
+        self.assertEqual(result["max"], 100)
+
+
+@test_function("ppic.stats:emit")
+class EmitTests(unittest.TestCase):
+    def test_it(self):
+        from ppic.stats import Stats, add_hook, remove_hook
+        stats = Stats()
+        stats.incr("packages", 3)
+        registered = []
+        extra = []
+        hook = add_hook(registered.append)
+        try:
+            result = self._callFUT(stats, hooks=[extra.append])
+        finally:
+            remove_hook(hook)
+        self.assertEqual(result["counters"], {"packages": 3})
+        self.assertEqual(registered, [result])
+        self.assertEqual(extra, [result])
+
+
+@test_target("ppic.resource:CachedResourceWrapper")
+class CacheCountersTests(unittest.TestCase):
+    def test_it(self):
+        from ppic.stats import Stats
+        from ppic.cache import CacheEntry
+        from ppic.tests.test_cache import CountingResource, DictStore, _make_request
+        stats = Stats()
+        store = DictStore()
+        store.set("old", CacheEntry(["old", True], 0))
+        target = self._getTarget()(CountingResource(), None, 10, backend=store, stats=stats)
+        with target.using():
+            target.access(_make_request("foo"))
+            target.access(_make_request("foo"))
+            target.access(_make_request("old"))
+        self.assertEqual(
+            stats.as_dict()["counters"], {"cache_miss": 1, "cache_hit": 1, "cache_expired": 1}
+        )
@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+import unittest
+from evilunit import test_target
+
+
+@test_target("ppic.version:VersionIndex")
+class Tests(unittest.TestCase):
+    def test_ordered(self):
+        target = self._makeOne(["1.7", "1.22", "1.8a1", "0.9"])
+        self.assertEqual(target.versions, ["1.22", "1.8a1", "1.7", "0.9"])
+        self.assertEqual(target.latest, "1.22")
+
+    def test_classified(self):
+        target = self._makeOne(["1.7", "1.8a1", "1.8b1b"])
+        self.assertEqual(target.stable_versions, ["1.7"])
+        self.assertEqual(target.prereleases, ["1.8a1", "1.8b1b"])  # 1.8b1b is unsupported format
+        self.assertEqual(target.latest_stable, "1.7")
+
+    def test_all_unstable(self):
+        target = self._makeOne(["1.8a1"])
+        self.assertIsNone(target.latest_stable)
+
+    def test_parsed_versions_are_memoized(self):
+        from ppic.version import parse_version
+        self._makeOne(["1.0", "2.0"])
+        self.assertIs(parse_version("1.0"), parse_version("1.0"))
+
+
+@test_target("ppic:SuccessInfo")
+class StableOnlyTests(unittest.TestCase):
+    def _makeOne(self, releases):
+        from ppic import Request, default_options
+        request = Request(name="foo", previous_version="1.7", distribution=None)
+        info = {
+            "info": {"name": "foo", "version": "1.8a1", "stable_version": None},
+            "releases": {v: [{"upload_time": "2014-12-04T23:16:25"}] for v in releases}
+        }
+        return self._getTarget()(request, info, default_options._replace(is_stable_only=True))
+
+    def test_it(self):
+        target = self._makeOne(["1.7", "1.8a1", "1.7.1"])
+        self.assertEqual(target.version, "1.7.1")
+        self.assertTrue(target.has_update())
+
+    def test_index_is_built_once(self):
+        target = self._makeOne(["1.7", "1.8a1", "1.7.1"])
+        index = target.version_index
+        target.normalized_format()
+        target.has_update()
+        self.assertIs(target.version_index, index)
+
+    def test_all_unstable(self):
+        target = self._makeOne(["1.8a1"])
+        self.assertEqual(target.version, "xxx")
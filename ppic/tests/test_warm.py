@@ -0,0 +1,40 @@
+# -*- coding:utf-8 -*-
+import unittest
+from evilunit import test_function
+from ppic.tests.test_cache import CountingResource, DictStore, _make_request
+
+
+def _make_cache(store, timeout=100):
+    from ppic.resource import CachedResourceWrapper
+    return CachedResourceWrapper(CountingResource(), None, timeout, backend=store)
+
+
+@test_function("ppic.warm:select_requests")
+class SelectRequestsTests(unittest.TestCase):
+    def test_closest_to_expiry_first(self):
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        store.set("fresh", CacheEntry(["fresh", True], 1000))
+        store.set("soon", CacheEntry(["soon", True], 950))
+        store.set("expired", CacheEntry(["expired", True], 800))
+        requests = [_make_request(name) for name in ["expired", "fresh", "missing", "soon"]]
+        result = self._callFUT(requests, _make_cache(store), within=60, now=1000)
+        self.assertEqual([r.name for r in result], ["missing", "expired", "soon"])
+
+    def test_limit(self):
+        requests = [_make_request(name) for name in ["a", "b", "c"]]
+        result = self._callFUT(requests, _make_cache(DictStore()), within=60, limit=2)
+        self.assertEqual(len(result), 2)
+
+
+@test_function("ppic.warm:RefreshingResource")
+class RefreshingResourceTests(unittest.TestCase):
+    def test_alive_entry_is_refreshed(self):
+        import time
+        from ppic.cache import CacheEntry
+        store = DictStore()
+        store.set("foo", CacheEntry(["old", True], int(time.time())))
+        cache = _make_cache(store)
+        with cache.using():
+            self._callFUT(cache).access(_make_request("foo"))
+        self.assertEqual(store.get("foo").value, ("foo", True))
@@ -0,0 +1,47 @@
+# -*- coding:utf-8 -*-
+import re
+
+# memoized across packages (many packages share version strings, e.g. "1.0")
+_parsed = {}
+_unstable = {}
+unstable_rx = re.compile(r"[\._][0-9]*([_\-a-zA-Z]+[0-9]*)+$")
+
+
+def parse_version(v):
+    try:
+        return _parsed[v]
+    except KeyError:
+        from distlib.version import NormalizedVersion, UnsupportedVersionError
+        try:
+            parsed = NormalizedVersion(v)
+        except UnsupportedVersionError:
+            parsed = NormalizedVersion("0")
+        _parsed[v] = parsed
+        return parsed
+
+
+def is_unstable(v):
+    # this is heuristic.
+    # 1.8a, 1.8a1, 1.8x is unstable
+    try:
+        return _unstable[v]
+    except KeyError:
+        result = _unstable[v] = unstable_rx.search(v) is not None
+        return result
+
+
+class VersionIndex(object):
+    """versions of a package, ordered (newest first) and classified once"""
+
+    def __init__(self, versions):
+        self.versions = sorted(versions, reverse=True, key=parse_version)
+        self.stable_versions = [v for v in self.versions if not is_unstable(v)]
+        self.prereleases = [v for v in self.versions if is_unstable(v)]
+
+    @property
+    def latest(self):
+        return self.versions[0] if self.versions else None
+
+    @property
+    def latest_stable(self):
+        return self.stable_versions[0] if self.stable_versions else None
@@ -0,0 +1,106 @@
+# -*- coding:utf-8 -*-
+"""
+`ppic warm`, refreshing cache entries closest to expiry (e.g. for cron, or a sidecar).
+
+  $ ppic warm --installed --within 300
+"""
+import json
+import time
+import itertools
+import contextlib
+from collections import OrderedDict
+from .stats import Stats, null_stats, emit, load_hook
+from .environment import canonicalize_name
+from logging import getLogger as get_logger
+logger = get_logger(__name__)
+
+
+def select_requests(request_list, cache, within, now=None, limit=None):
+    """requests whose entries are missing, or expiring within `within` seconds (closest to expiry first)"""
+    now = time.time() if now is None else now
+    candidates = []
+    for request in request_list:
+        entry = cache.backend.get(cache.key(request))
+        expires_in = float("-inf") if entry is None else cache.expires_in(entry, now=now)
+        if expires_in <= within:
+            candidates.append((expires_in, request))
+    candidates.sort(key=lambda pair: pair[0])
+    return [request for _, request in candidates[:limit]]
+
+
+class RefreshingResource(object):
+    """fetching and storing, even if the cache entry is alive"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def access(self, request):
+        return self.cache.refresh(request)
+
+    @contextlib.contextmanager
+    def using(self):
+        yield self  # cache.using() is entered by warm()
+
+
+def collect_requests(parser, options, working_set=None):
+    from . import get_working_set, collect_request_list, parse_requirements_file
+    if parser.env:
+        working_sets = [
+            get_working_set([path], backend=parser.environment_backend) for path in parser.env
+        ]
+    else:
+        working_sets = [working_set or get_working_set(backend=parser.environment_backend)]
+    requirements = list(
+        itertools.chain.from_iterable(parse_requirements_file(f) for f in parser.requirements)
+    )
+    unique = OrderedDict()
+    for working_set in working_sets:
+        for request in collect_request_list(
+            parser.package, working_set, options=options, requirements=requirements
+        ):
+            unique.setdefault(canonicalize_name(request.name), request)
+    return sorted(unique.values(), key=lambda r: r.name)
+
+
+def warm(request_list, options, within, limit=None, stats=null_stats):
+    from . import make_resource, iterate_info_list
+    cache = make_resource(options, usecache=True, stats=stats)
+    with cache.using():
+        selected = select_requests(request_list, cache, within, limit=limit)
+        result = OrderedDict(refreshed=[], failed=[], fresh=len(request_list) - len(selected))
+        infos = iterate_info_list(
+            selected, options._replace(use_asyncio=False), resource=RefreshingResource(cache)
+        )
+        for info in infos:
+            result["refreshed" if info.is_success() else "failed"].append(info.name)
+    result["refreshed"].sort()
+    result["failed"].sort()
+    return result
+
+
+def main(argv, working_set=None):
+    from . import make_parser, options_from_args, setup_logging
+    parser = make_parser(prog="ppic warm")
+    parser.add_argument(
+        "--within",
+        type=int,
+        default=None,
+        metavar="SECONDS",
+        help="refreshing entries expiring within SECONDS (default is a half of --cache-timeout)"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="max number of refreshed entries")
+    args = parser.parse_args(argv)
+    if args.no_cache or args.index_source is not None:
+        parser.error("warm is for temporary cache (--no-cache and --index-source are not supported)")
+    setup_logging(args)
+    options = options_from_args(args)
+    within = options.cache_timeout // 2 if args.within is None else args.within
+
+    stats = Stats()
+    request_list = collect_requests(args, options, working_set=working_set)
+    with stats.phase("fetch"):
+        output_dict = warm(request_list, options, within, limit=args.limit, stats=stats)
+    stats_dict = emit(stats, hooks=[load_hook(spec) for spec in args.stats_hook])
+    if args.stats:
+        output_dict["stats"] = stats_dict
+    print(json.dumps(output_dict, indent=2, ensure_ascii=False))